@@ -1,11 +1,17 @@
 from tqdm import tqdm  # For progress tracking
 import axelrod as axl
-import networkx as nx
 import random
 import csv
 import os
+import sys
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+from background_writer import BackgroundWriter  # noqa: E402
+from graph_loader import load_graph_with_names  # noqa: E402
+from match_cache import MatchCache  # noqa: E402
+from parallel_tournament import play_tournament  # noqa: E402
+
 # Strategy dictionary
 strategies = {
     "Cooperator": axl.Cooperator,
@@ -21,31 +27,6 @@ strategies = {
 }
 
 
-def load_graph_with_names(file_path):
-    """
-    Load a graph from a MatrixMarket coordinate pattern file and assign player names.
-    """
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
-
-    edges = []
-    for line in lines:
-        if line.startswith('%'):  # Skip comment lines
-            continue
-        parts = line.split()
-        if len(parts) == 2:  # Ensure it's a valid edge
-            node1, node2 = map(int, parts)
-            edges.append((node1, node2))
-
-    # Create a graph and label nodes with "Player X"
-    G = nx.Graph()
-    G.add_edges_from(edges)
-    for node in G.nodes():
-        G.nodes[node]['name'] = f"{node}"
-        G.nodes[node]['score'] = 0  # Initialize scores
-    return G
-
-
 def assign_strategies(graph, strategies):
     """
     Assign a random strategy to each node in the graph from a list of strategies.
@@ -62,26 +43,28 @@ def assign_strategies(graph, strategies):
         # Save the strategy name
         graph.nodes[node]['strategy_name'] = selected_strategy.__name__
 
-def play_games(graph, rounds=100):
+
+def play_games(graph, rounds=100, cache=None):
     """
     Play the Iterated Prisoner's Dilemma on each edge of the graph.
+
+    Args:
+        graph (networkx.Graph): The graph representing players and their connections.
+        rounds (int): Number of turns of every match.
+        cache (MatchCache, optional): Cache of deterministic match results, a new one by default.
+
+    Returns:
+        MatchCache: The cache used, with its hit statistics.
     """
     game = axl.Game()  # Define the game scoring
+    if cache is None:
+        cache = MatchCache()
 
     for u, v in tqdm(graph.edges(), desc="Processing edges"):
         strategy_u = graph.nodes[u]['strategy']
         strategy_v = graph.nodes[v]['strategy']
 
-        # Play one match
-        match = axl.Match([strategy_u(), strategy_v()], turns=rounds)
-        actions = match.play()
-
-        # Compute numerical scores for the match
-        scores_u, scores_v = 0, 0
-        for action_u, action_v in actions:
-            score_u, score_v = game.score((action_u, action_v))
-            scores_u += score_u
-            scores_v += score_v
+        scores_u, scores_v = cache.scores(strategy_u, strategy_v, rounds, game)
 
         # Update scores in the graph
         graph.nodes[u]['score'] += scores_u
@@ -90,6 +73,46 @@ def play_games(graph, rounds=100):
         # Store the scores for the edge
         graph.edges[u, v]['scores'] = (scores_u, scores_v)
 
+    print(f"Match cache hit rate: {cache.hit_rate():.1%} "
+          f"({cache.hits} hits, {cache.misses} matches played)")
+    return cache
+
+
+def play_games_parallel(graph, rounds=100, workers=None, seed=None):
+    """
+    Same as play_games, with the edges split into shards played on all cores.
+
+    Args:
+        graph (networkx.Graph): The graph representing players and their connections.
+        rounds (int): Number of turns of every match.
+        workers (int, optional): Number of processes, all cores by default.
+        seed (int, optional): Seed for the stochastic matches, results do not depend on workers.
+
+    Returns:
+        dict: Timing and throughput of the tournament, see parallel_tournament.play_tournament.
+    """
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    # Strategy classes in order of first appearance
+    strategy_list = list(dict.fromkeys(graph.nodes[n]['strategy'] for n in nodes))
+    codes = {strategy: i for i, strategy in enumerate(strategy_list)}
+    strategy_codes = [codes[graph.nodes[n]['strategy']] for n in nodes]
+    edge_list = list(graph.edges())
+    edges = [(index[u], index[v]) for u, v in edge_list]
+
+    result = play_tournament(edges, strategy_codes, strategy_list, turns=rounds,
+                             workers=workers, seed=seed)
+
+    # Update scores in the graph
+    for node, score in zip(nodes, result["node_scores"].tolist()):
+        graph.nodes[node]['score'] += score
+    for (u, v), scores in zip(edge_list, result["edge_scores"].tolist()):
+        graph.edges[u, v]['scores'] = tuple(scores)
+
+    print(f"Played {len(edges)} edges on {result['workers']} processes in "
+          f"{result['seconds']:.1f}s ({result['edges_per_second']:.0f} edges/s)")
+    return result
+
 
 def find_best_player(graph):
     """
@@ -99,9 +122,25 @@ def find_best_player(graph):
     return best_player[1]['name'], best_player[1]['score']
 
 
-def save_results_to_csv(graph, file_name="network_results.csv"):
+def write_csv(df, file_name, message, writer=None):
+    """
+    Write a DataFrame to CSV, on the background writer if one is given.
+    """
+    def write():
+        df.to_csv(file_name, index=False)
+        print(f"{message} {file_name}")
+
+    if writer is None:
+        write()
+    else:
+        writer.submit(write)
+
+
+def save_results_to_csv(graph, file_name="network_results.csv", writer=None):
     """
     Save game results and node scores to a CSV file.
+    The rows are collected here, `writer` (background_writer.BackgroundWriter)
+    writes the files while the caller continues.
     """
     os.makedirs("data/network_results", exist_ok=True)
 
@@ -126,9 +165,7 @@ def save_results_to_csv(graph, file_name="network_results.csv"):
         })
 
     # Save the data to CSV
-    df = pd.DataFrame(data)
-    df.to_csv(file_name, index=False)
-    print(f"Edge results saved to {file_name}")
+    write_csv(pd.DataFrame(data), file_name, "Edge results saved to", writer)
 
     os.makedirs("data/best_players", exist_ok=True)
 
@@ -148,10 +185,9 @@ def save_results_to_csv(graph, file_name="network_results.csv"):
     df_nodes = pd.DataFrame(node_data)
 
     # Save the data to CSV
-    df_nodes.to_csv(file_name, index=False)
-    print(f"Player scores saved to {file_name}")
+    write_csv(df_nodes, file_name, "Player scores saved to", writer)
 
-def save_detailed_results_to_csv(graph, file_name="detailed_network_results.csv"):
+def save_detailed_results_to_csv(graph, file_name="detailed_network_results.csv", writer=None):
     """
     Save detailed results to a CSV file including node name, score, strategy, and players interacted with.
     """
@@ -161,6 +197,7 @@ def save_detailed_results_to_csv(graph, file_name="detailed_network_results.csv"
     Args:
         graph (networkx.Graph): The graph containing node details and scores.
         folder_name (str): Name of the folder where the results will be saved.
+        writer (BackgroundWriter, optional): Writes the file in the background.
     """
     # Ensure the folder exists
     os.makedirs("detailed_results", exist_ok=True)
@@ -189,20 +226,28 @@ def save_detailed_results_to_csv(graph, file_name="detailed_network_results.csv"
             "Node Name": node_name,
             "Total Score": node_score,
             "Strategy": node_strategy,
-            "Players Interacted With": ", ".join(connected_players)
+            "Players Interacted With": connected_players
         })
 
-    # Save the data to CSV
+    # Joining the names is part of the writing, it runs on the writer
     df = pd.DataFrame(data)
-    df.to_csv(file_name, index=False)
-    print(f"Detailed results with strategies saved to {file_name}")
+
+    def write():
+        df["Players Interacted With"] = df["Players Interacted With"].str.join(", ")
+        df.to_csv(file_name, index=False)
+        print(f"Detailed results with strategies saved to {file_name}")
+
+    if writer is None:
+        write()
+    else:
+        writer.submit(write)
 
 
 
 def main():
     # Load the graph
     file_path = "fb_graph/matname.mtx"  # Replace with your file's path
-    graph = load_graph_with_names(file_path)
+    graph = load_graph_with_names(file_path, name_format="{}")
 
     # Define strategies
     strategies = [
@@ -221,18 +266,20 @@ def main():
     # Assign strategies to nodes
     assign_strategies(graph, strategies)
 
-    # Play games
+    # Play games (play_games_parallel(graph) uses all cores)
     play_games(graph)
 
-    # Find the best player
-    best_player, best_score = find_best_player(graph)
-    print(f"The best player in the network is {best_player} with a total score of {best_score}.")
+    # The CSV files are written in the background, closing the writer waits for them
+    with BackgroundWriter() as writer:
+        # Save results to CSV
+        save_results_to_csv(graph, writer=writer)
 
-    # Save results to CSV
-    save_results_to_csv(graph)
+        #Save detailed results to CSV
+        save_detailed_results_to_csv(graph, writer=writer)
 
-    #Save detailed results to CSV
-    save_detailed_results_to_csv(graph)
+        # Find the best player
+        best_player, best_score = find_best_player(graph)
+        print(f"The best player in the network is {best_player} with a total score of {best_score}.")
 
 
 if __name__ == "__main__":
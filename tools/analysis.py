@@ -0,0 +1,124 @@
+"""
+Reports on the results of a spatial tournament: a TournamentResults filled
+in memory while the matches are played (see tournament_results), or the
+interactions CSV written by `axl.Tournament.play(filename=...)`, e.g.
+100_turns.csv, read once into a typed table.
+
+Every report works from the per-player table built by `player_table`:
+
+    results = load_results("100_turns.csv")  # or a TournamentResults
+    players = player_table(results, "fb_graph/matname.mtx")
+    good, bad = split_by_mean(strategy_stats(players))
+"""
+import pandas as pd
+
+from graph_features import load_features
+from tournament_results import RESULT_COLUMNS, TournamentResults
+
+
+def load_results(file_path):
+    """
+    Read the columns the reports use from a tournament interactions CSV.
+    """
+    return pd.read_csv(file_path, usecols=list(RESULT_COLUMNS), dtype=RESULT_COLUMNS)
+
+
+def player_table(results, graph_file=None):
+    """
+    One row per player, indexed by "Player index": strategy and total score,
+    plus degree, clustering coefficient and score per relation when the
+    graph file is given (features are cached, see graph_features).
+    """
+    if isinstance(results, TournamentResults):
+        players = results.player_scores()
+    else:
+        grouped = results.groupby("Player index")
+        players = pd.DataFrame({
+            "Strategy": grouped["Player name"].first(),
+            "Score": grouped["Score"].sum(),
+        })
+    if graph_file is not None:
+        features = load_features(graph_file)
+        players["Relations"] = features["degree"][players.index]
+        players["Clustering Coefficient"] = features["clustering"][players.index]
+        players["Mean Score per Relation"] = players["Score"] / players["Relations"]
+    return players
+
+
+def strategy_stats(players, epsilon=1e-8):
+    """
+    Mean and standard deviation of the total score of every strategy, the
+    standard deviation min-max normalized over strategies and, if the table
+    has relations, the mean score per relation.
+    """
+    aggregations = {"mean": ("Score", "mean"), "std": ("Score", "std")}
+    if "Mean Score per Relation" in players:
+        aggregations["mean_per_relation"] = ("Mean Score per Relation", "mean")
+    stats = players.groupby("Strategy", observed=True).agg(**aggregations).reset_index()
+
+    std_min, std_max = stats["std"].min(), stats["std"].max()
+    stats["Normalized Std"] = (stats["std"] - std_min) / (std_max - std_min + epsilon)
+    return stats
+
+
+def split_by_mean(stats):
+    """
+    Split strategy_stats into good (above the mean over strategies) and bad strategies.
+    """
+    overall_mean_score = stats["mean"].mean()
+    return (stats[stats["mean"] > overall_mean_score],
+            stats[stats["mean"] <= overall_mean_score])
+
+
+def cooperator_vs_defector(results, names=("Cooperator", "Defector")):
+    """
+    Score per game of the given strategies.
+
+    Returns:
+        tuple: (overall, by_opponent) where overall has the mean and std of
+        every strategy and by_opponent maps each strategy to its mean and std
+        against every opponent strategy.
+    """
+    if isinstance(results, TournamentResults):
+        return opponent_breakdown(results, names)
+    games = results[results["Player name"].isin(names)]
+    games = games.assign(**{"Player name": games["Player name"].astype(str),
+                            "Opponent name": games["Opponent name"].astype(str)})
+    overall = games.groupby("Player name")["Score"].agg(["mean", "std"]).reindex(list(names))
+    by_opponent = {
+        name: group.groupby("Opponent name")["Score"].agg(["mean", "std"])
+        for name, group in games.groupby("Player name")
+    }
+    return overall, by_opponent
+
+
+def opponent_breakdown(results, names):
+    """
+    cooperator_vs_defector from the running sums of a TournamentResults.
+    """
+    overall = results.strategy_stats()[["mean", "std"]].reindex(list(names))
+    stats = results.opponent_stats()
+    by_opponent = {
+        name: group.droplevel("Player name")[["mean", "std"]].sort_index()
+        for name, group in stats.groupby(level="Player name")
+        if name in names
+    }
+    return overall, by_opponent
+
+
+def clustering_split(players):
+    """
+    Mean score of every strategy among all nodes and among the nodes above
+    ("High") and at or below ("Low") the median clustering coefficient.
+
+    Returns:
+        pandas.DataFrame: Columns "All", "High" and "Low", one row per strategy.
+    """
+    clustering = players["Clustering Coefficient"]
+    high = clustering > clustering.median()
+    by_strategy = players.groupby("Strategy", observed=True)["Score"]
+    return pd.DataFrame({
+        "All": by_strategy.mean(),
+        "High": players[high].groupby("Strategy", observed=True)["Score"].mean(),
+        "Low": players[~high].groupby("Strategy", observed=True)["Score"].mean(),
+    })
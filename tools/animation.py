@@ -1,10 +1,13 @@
 from tqdm import tqdm  # For progress tracking
 import axelrod as axl
-import networkx as nx
 import random
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+
+from edge_matches import EdgeMatches
+from graph_loader import load_graph_with_names
+from graph_renderer import GraphRenderer, save_gif
+from layouts import cached_layout
 
 STRATEGY_COLORS = {
     "Cooperator": "blue",
@@ -12,39 +15,8 @@ STRATEGY_COLORS = {
     "TitForTat": "green",
     "Random": "purple"
 }
-
-
-def load_graph_with_names(file_path, max_edges=None):
-    """
-    Load a graph from a MatrixMarket coordinate pattern file and assign player names.
-
-    Args:
-        file_path (str): Path to the .mtx file.
-        max_edges (int, optional): Maximum number of edges to load. If None, load all edges.
-    """
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
-
-    edges = []
-    for line in lines:
-        if line.startswith('%'):  # Skip comment lines
-            continue
-        parts = line.split()
-        if len(parts) == 2:  # Ensure it's a valid edge
-            node1, node2 = map(int, parts)
-            edges.append((node1, node2))
-
-    # If max_edges is specified, limit the number of edges
-    if max_edges is not None:
-        edges = edges[:max_edges]
-
-    # Create a graph and label nodes with "Player X"
-    G = nx.Graph()
-    G.add_edges_from(edges)
-    for node in G.nodes():
-        G.nodes[node]['name'] = f"Player {node}"
-        G.nodes[node]['score'] = 0  # Initialize scores
-    return G
+# Larger graphs are drawn without labels, they would only cover each other
+MAX_LABELED_NODES = 300
 
 
 def assign_strategies(graph, strategies):
@@ -55,70 +27,49 @@ def assign_strategies(graph, strategies):
         graph.nodes[node]['strategy'] = random.choice(strategies)
 
 
-def play_game_round(graph, round_num):
+def play_game_round(graph, matches):
     """
-    Play a single round of the Iterated Prisoner's Dilemma on each edge of the graph.
-    """
-    game = axl.Game()  # Define the game scoring
-
-    for u, v in graph.edges():
-        strategy_u = graph.nodes[u]['strategy']
-        strategy_v = graph.nodes[v]['strategy']
-
-        # Play one match with only one round
-        match = axl.Match([strategy_u(), strategy_v()], turns=round_num + 1)
-        actions = match.play()
-
-        # Extract scores for the current round
-        score_u, score_v = game.score(actions[round_num])
+    Play the next round of the Iterated Prisoner's Dilemma on each edge of the graph.
 
+    Args:
+        graph (networkx.Graph): Graph holding the node scores.
+        matches (EdgeMatches): Running matches, advanced by one turn.
+    """
+    for (u, v), (score_u, score_v) in matches.step().items():
         # Update scores incrementally
         graph.nodes[u]['score'] += score_u
         graph.nodes[v]['score'] += score_v
 
 
-def update(frame, graph, pos, ax):
+def update(frame, graph, renderer, matches):
     """
-    Update function for animation frames.
+    Update function for animation frames, only node colors and labels change.
     """
-    ax.clear()
-    ax.axis("off")
-
-    # Play one round of the game
-    play_game_round(graph, frame)
-
-    # Get node attributes
-    scores = nx.get_node_attributes(graph, 'score')
-    strategies = nx.get_node_attributes(graph, 'strategy')
-
-    # Draw edges
-    nx.draw_networkx_edges(graph, pos, ax=ax)
-
-    # Draw nodes with colors based on strategies
-    node_colors = [STRATEGY_COLORS[strategies[node].__name__]
-                   for node in graph.nodes()]
-    nx.draw_networkx_nodes(
-        graph, pos, ax=ax, node_color=node_colors, node_size=500)
-
-    # Add labels for scores
-    labels = {node: f"{graph.nodes[node]['name']}\n{scores[node]}" for node in graph.nodes()}
-    nx.draw_networkx_labels(graph, pos, labels=labels, font_size=8, ax=ax)
+    # Play up to this round (FuncAnimation may draw the same frame twice)
+    while matches.turn <= frame:
+        play_game_round(graph, matches)
 
-    # Title for the frame
-    ax.set_title(f"Round {frame + 1}")
+    # Colors based on strategies, labels with the scores
+    nodes = [graph.nodes[node] for node in renderer.nodes]
+    node_colors = [STRATEGY_COLORS[data['strategy'].__name__] for data in nodes]
+    labels = [f"{data['name']}\n{data['score']}" for data in nodes]
+    return renderer.update(node_colors, labels, title=f"Round {frame + 1}")
 
 
 def animate_graph(graph, total_rounds=10, interval=1000, output_file="graph_animation.gif"):
     """
     Animate the graph, showing nodes' strategies and scores over rounds.
+    `interval` is the time each round is shown, in milliseconds.
     """
-    pos = nx.spring_layout(graph)  # Position nodes using a spring layout
+    pos = cached_layout(graph)  # Spring layout, computed once per graph
+    matches = EdgeMatches(graph, turns=total_rounds)
     fig, ax = plt.subplots(figsize=(10, 8))
-    ani = animation.FuncAnimation(
-        fig, update, frames=total_rounds, fargs=(graph, pos, ax), interval=interval)
+    font_size = 8 if graph.number_of_nodes() <= MAX_LABELED_NODES else None
+    renderer = GraphRenderer(graph, pos, ax, font_size=font_size)
 
-    # Save the animation as a GIF
-    ani.save(output_file, writer="pillow", fps=1)
+    # Frames are blitted one at a time, save_gif keeps them as 256-color images
+    frames = (update(frame, graph, renderer, matches) for frame in range(total_rounds))
+    save_gif(renderer, frames, output_file, fps=1000 / interval)
     plt.close(fig)
     print(f"Animation saved to {output_file}")
 
@@ -3,7 +3,12 @@ import axelrod as axl
 import networkx as nx
 import random
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+
+from edge_matches import EdgeMatches
+from graph_features import component_nodes, load_features
+from graph_loader import load_graph_with_names
+from graph_renderer import GraphRenderer, save_gif
+from layouts import cached_layout, file_layout
 
 STRATEGY_COLORS = {
     "Cooperator": "blue",
@@ -11,31 +16,8 @@ STRATEGY_COLORS = {
     "TitForTat": "green",
     "Random": "purple"
 }
-
-
-def load_graph_with_names(file_path):
-    """
-    Load a graph from a MatrixMarket coordinate pattern file and assign player names.
-    """
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
-
-    edges = []
-    for line in lines:
-        if line.startswith('%'):  # Skip comment lines
-            continue
-        parts = line.split()
-        if len(parts) == 2:  # Ensure it's a valid edge
-            node1, node2 = map(int, parts)
-            edges.append((node1, node2))
-
-    # Create a graph and label nodes with "Player X"
-    G = nx.Graph()
-    G.add_edges_from(edges)
-    for node in G.nodes():
-        G.nodes[node]['name'] = f"Player {node}"
-        G.nodes[node]['score'] = 0  # Initialize scores
-    return G
+# Larger graphs are drawn without labels, they would only cover each other
+MAX_LABELED_NODES = 300
 
 
 def assign_strategies(graph, strategies):
@@ -46,35 +28,30 @@ def assign_strategies(graph, strategies):
         graph.nodes[node]['strategy'] = random.choice(strategies)
 
 
-def play_game_round(graph, round_num):
+def play_game_round(graph, matches):
     """
-    Play a single round of the Iterated Prisoner's Dilemma on each edge of the graph.
-    """
-    game = axl.Game()  # Define the game scoring
-
-    for u, v in graph.edges():
-        strategy_u = graph.nodes[u]['strategy']
-        strategy_v = graph.nodes[v]['strategy']
-
-        # Play one match with only one round
-        match = axl.Match([strategy_u(), strategy_v()], turns=round_num + 1)
-        actions = match.play()
-
-        # Extract scores for the current round
-        score_u, score_v = game.score(actions[round_num])
+    Play the next round of the Iterated Prisoner's Dilemma on each edge of the graph.
 
+    Args:
+        graph (networkx.Graph): Graph holding the node scores.
+        matches (EdgeMatches): Running matches, advanced by one turn.
+    """
+    for (u, v), (score_u, score_v) in matches.step().items():
         # Update scores incrementally
         graph.nodes[u]['score'] += score_u
         graph.nodes[v]['score'] += score_v
 
 
-def get_connected_component(graph, player_id):
+def get_connected_component(graph, player_id, features=None):
     """
     Find the connected component for the specified player in the graph.
     
     Args:
         graph (networkx.Graph): The full graph.
         player_id (int): The ID of the player.
+        features (dict, optional): Cached features of the graph file (see
+            graph_features), used instead of a BFS. Node IDs must be the
+            file's 1-based IDs, as given by load_graph_with_names.
 
     Returns:
         networkx.Graph: Subgraph containing all nodes connected to the specified player.
@@ -83,60 +60,60 @@ def get_connected_component(graph, player_id):
         raise ValueError(f"Player {player_id} is not in the graph.")
 
     # Get all nodes in the connected component
-    connected_nodes = nx.node_connected_component(graph, player_id)
+    if features is None:
+        connected_nodes = nx.node_connected_component(graph, player_id)
+    else:
+        connected_nodes = (component_nodes(features, player_id - 1) + 1).tolist()
 
     # Create and return the subgraph
     return graph.subgraph(connected_nodes)
 
 
-def update(frame, graph, pos, ax, subgraph):
+def update(frame, graph, renderer, matches):
     """
-    Update function for animation frames.
+    Update function for animation frames, only node colors and labels of the
+    subgraph change.
     """
-    ax.clear()
-    ax.axis("off")
-
-    # Play one round of the game
-    play_game_round(graph, frame)
-
-    # Get node attributes
-    scores = nx.get_node_attributes(graph, 'score')
-    strategies = nx.get_node_attributes(graph, 'strategy')
-
-    # Draw edges in the subgraph
-    nx.draw_networkx_edges(subgraph, pos, ax=ax)
+    # Play up to this round (FuncAnimation may draw the same frame twice)
+    while matches.turn <= frame:
+        play_game_round(graph, matches)
 
-    # Draw nodes in the subgraph with colors based on strategies
-    node_colors = [STRATEGY_COLORS[strategies[node].__name__]
-                   for node in subgraph.nodes()]
-    nx.draw_networkx_nodes(
-        subgraph, pos, ax=ax, node_color=node_colors, node_size=500)
+    # Colors based on strategies, labels with the scores
+    nodes = [graph.nodes[node] for node in renderer.nodes]
+    node_colors = [STRATEGY_COLORS[data['strategy'].__name__] for data in nodes]
+    labels = [f"{data['name']}\n{data['score']}" for data in nodes]
+    return renderer.update(node_colors, labels, title=f"Round {frame + 1}")
 
-    # Add labels for scores in the subgraph
-    labels = {node: f"{graph.nodes[node]['name']}\n{scores[node]}" for node in subgraph.nodes()}
-    nx.draw_networkx_labels(subgraph, pos, labels=labels, font_size=8, ax=ax)
 
-    # Title for the frame
-    ax.set_title(f"Round {frame + 1}")
-
-
-def animate_subgraph(graph, player_id, total_rounds=10, interval=1000, output_file="connected_component_animation.gif"):
+def animate_subgraph(graph, player_id, total_rounds=10, interval=1000, output_file="connected_component_animation.gif",
+                     features=None, layout=None):
     """
     Animate the connected component for a specific player.
+
+    `interval` is the time each round is shown, in milliseconds. `layout` is
+    an optional (N, 2) layout of the whole graph file (see
+    layouts.file_layout), indexed by the 0-based node index.
     """
     # Get the connected component for the specified player
-    subgraph = get_connected_component(graph, player_id)
+    subgraph = get_connected_component(graph, player_id, features)
+
+    # Use the shared layout of the graph file, or one computed once per subgraph
+    if layout is not None:
+        pos = {node: layout[node - 1] for node in subgraph.nodes()}
+    else:
+        pos = cached_layout(subgraph)
 
-    # Use a spring layout for consistent visualization
-    pos = nx.spring_layout(subgraph)
+    # Only the edges of the component change the scores shown
+    matches = EdgeMatches(subgraph, turns=total_rounds)
 
     # Create the animation
     fig, ax = plt.subplots(figsize=(10, 8))
-    ani = animation.FuncAnimation(
-        fig, update, frames=total_rounds, fargs=(graph, pos, ax, subgraph), interval=interval)
+    font_size = 8 if subgraph.number_of_nodes() <= MAX_LABELED_NODES else None
+    renderer = GraphRenderer(subgraph, pos, ax, font_size=font_size)
 
-    # Save the animation as a GIF
-    ani.save(output_file, writer="pillow", fps=1)
+    # Frames are blitted one at a time, save_gif keeps them as 256-color images
+    frames = (update(frame, graph, renderer, matches) for frame in range(total_rounds))
+    save_gif(renderer, frames, output_file, fps=1000 / interval)
     plt.close(fig)
     print(f"Animation for Player {player_id} saved to {output_file}")
 
@@ -154,7 +131,8 @@ def main():
 
     # Animate the connected component for a specific player (e.g., Player 224)
     animate_subgraph(graph, player_id=2, total_rounds=10,
-                     interval=10, output_file="connected_component_animation.gif")
+                     interval=1000, output_file="connected_component_animation.gif",
+                     features=load_features(file_path), layout=file_layout(file_path))
 
 
 if __name__ == "__main__":
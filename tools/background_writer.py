@@ -0,0 +1,141 @@
+"""
+Write results on a background thread while the simulation keeps computing.
+
+BackgroundWriter runs submitted calls in order on one writer thread. The
+queue between the two threads is bounded: when the writer falls behind by
+`max_pending` calls, `submit` blocks until it catches up, so a slow disk
+slows the simulation down instead of filling the memory. An exception on the
+writer thread stops it: the calls still queued are dropped, the writer stays
+failed and every later `submit`, `wait` or `close` raises the exception.
+
+    with BackgroundWriter() as writer:
+        writer.submit(df.to_csv, "results.csv", index=False)
+        ...  # more work while the file is written
+
+BackgroundSink puts a result sink (see result_sink) or an interaction log
+behind a writer: `append` copies its arrays and returns at once, `flush`
+waits until everything before it is written (checkpoints rely on that) and
+`close` waits for the writer to finish.
+"""
+import queue
+import threading
+
+import numpy as np
+
+POLL_SECONDS = 0.1  # How often blocked calls check whether the writer failed
+
+
+class BackgroundWriter:
+    """
+    Run calls in submission order on a writer thread.
+
+    Args:
+        max_pending (int): Calls that may wait in the queue before `submit` blocks.
+    """
+
+    def __init__(self, max_pending=8):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="background-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            task = self.queue.get()
+            try:
+                if task is None:
+                    return
+                function, args, kwargs = task
+                function(*args, **kwargs)
+            except BaseException as error:
+                self.error = error
+                return
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _put(self, task):
+        # A full queue is never drained again once the thread has stopped
+        while self.thread.is_alive():
+            try:
+                self.queue.put(task, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue `function(*args, **kwargs)`, blocking while the queue is full.
+        The arguments must not be modified afterwards.
+        """
+        self._raise_error()
+        self._put((function, args, kwargs))
+        self._raise_error()
+
+    def wait(self):
+        """
+        Block until every submitted call has run.
+        """
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and self.thread.is_alive():
+                self.queue.all_tasks_done.wait(POLL_SECONDS)
+        self._raise_error()
+
+    def close(self):
+        """
+        Run the remaining calls and stop the thread.
+        """
+        self._put(None)
+        self.thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BackgroundSink:
+    """
+    Result sink or interaction log whose writes run on a BackgroundWriter.
+
+    `open` runs right away, so the output is set up (and old chunks of a
+    resumed run are removed) before the first iteration.
+
+    Args:
+        sink: Object with open, append, flush, close and bytes_written,
+            e.g. result_sink.ChunkedSink or interaction_log.InteractionLog.
+        max_pending (int): Appends that may wait before `append` blocks.
+    """
+
+    def __init__(self, sink, max_pending=8):
+        self.sink = sink
+        self.max_pending = max_pending
+
+    @property
+    def bytes_written(self):
+        # Lags behind the appends still in the queue
+        return self.sink.bytes_written
+
+    def open(self, *args):
+        self.sink.open(*args)
+        self.writer = BackgroundWriter(self.max_pending)
+
+    def append(self, *arrays):
+        # The caller may change its arrays in the next iteration
+        self.writer.submit(self.sink.append, *(np.array(array) for array in arrays))
+
+    def flush(self):
+        self.writer.submit(self.sink.flush)
+        self.writer.wait()
+
+    def close(self):
+        try:
+            self.writer.submit(self.sink.close)
+        finally:
+            # Stops the thread even when the writer has failed
+            self.writer.close()
@@ -0,0 +1,294 @@
+"""
+Scaling benchmarks of the engines over the fb_graph size ladder.
+
+Every case (engine, graph, turns or iterations) runs in a fresh process, so
+peak memory is measured per case. A case records wall time, edge-turns per
+second, peak RSS and its growth during the case, and the peak of the Python
+and NumPy allocations seen by tracemalloc (a second run, the tracing slows
+it down). Once an engine takes longer than the time budget on a graph it is
+not run on larger graphs.
+
+Run from the repository root:
+
+    python tools/benchmark.py                   # writes benchmarks/results.json
+    python tools/benchmark.py --save-baseline   # also stores it as the baseline
+    python tools/benchmark.py --engines simulate tournament --graphs fb_graph/matname.mtx
+
+Cases slower than the stored baseline by more than the tolerance are
+reported as regressions and make the script exit with status 1.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from graph_loader import load_csr, load_graph, undirected_edges
+from parallel_tournament import pool_context
+
+# Size ladder shipped in fb_graph, smallest first
+GRAPHS = [
+    "fb_graph/matname_10.mtx",
+    "fb_graph/matname_10^2.mtx",
+    "fb_graph/matname_10^3.mtx",
+    "fb_graph/matname.mtx",
+]
+RESULTS_FILE = "benchmarks/results.json"
+BASELINE_FILE = "benchmarks/baseline.json"
+
+ARCHIV_IMPLEMENTATION = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "archiv", "custome_implementation.py")
+
+
+def bench_load_graph(file_path, _):
+    return load_graph(file_path).number_of_edges()
+
+
+def bench_load_csr_cold(file_path, _):
+    # A copy of the .mtx without a cache, the user's cache is left alone
+    with tempfile.TemporaryDirectory() as directory:
+        copy = shutil.copy(file_path, directory)
+        started = time.perf_counter()
+        edges = len(undirected_edges(load_csr(copy)))
+        return edges, time.perf_counter() - started
+
+
+def bench_load_csr_warm(file_path, _):
+    load_csr(file_path)
+    started = time.perf_counter()
+    edges = len(undirected_edges(load_csr(file_path)))
+    return edges, time.perf_counter() - started
+
+
+def tournament_setup(file_path):
+    import axelrod as axl
+    edges = undirected_edges(load_csr(file_path))
+    strategies = [axl.Cooperator, axl.Defector, axl.TitForTat, axl.Grudger, axl.Random]
+    codes = np.random.default_rng(0).integers(len(strategies), size=edges.max() + 1)
+    return edges, codes, strategies
+
+
+def bench_tournament(file_path, turns):
+    from parallel_tournament import play_tournament
+    edges, codes, strategies = tournament_setup(file_path)
+    play_tournament(edges, codes, strategies, turns=turns, workers=1, seed=0)
+    return len(edges) * turns
+
+
+def bench_play_games(file_path, turns):
+    import axelrod as axl
+    from graph_loader import load_graph_with_names
+    spec = importlib.util.spec_from_file_location("custome_implementation", ARCHIV_IMPLEMENTATION)
+    implementation = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(implementation)
+
+    graph = load_graph_with_names(file_path)
+    implementation.assign_strategies(graph, [axl.Cooperator, axl.Defector, axl.TitForTat,
+                                             axl.Grudger, axl.Random])
+    implementation.play_games(graph, rounds=turns)
+    return graph.number_of_edges() * turns
+
+
+def bench_play_game_round(file_path, turns):
+    import axelrod as axl
+    from animation import assign_strategies, play_game_round
+    from edge_matches import EdgeMatches
+    from graph_loader import load_graph_with_names
+
+    graph = load_graph_with_names(file_path)
+    assign_strategies(graph, [axl.Cooperator, axl.Defector, axl.TitForTat, axl.Random])
+    matches = EdgeMatches(graph, turns=turns, seed=0)
+    for _ in range(turns):
+        play_game_round(graph, matches)
+    return graph.number_of_edges() * turns
+
+
+def bench_simulate(file_path, iterations):
+    from vectorized_simulation import simulate
+    with tempfile.TemporaryDirectory() as directory:
+        population = simulate(file_path, iterations=iterations, seed=0,
+                              strategy_csv=os.path.join(directory, "strategy.csv"),
+                              payoff_csv=os.path.join(directory, "payoff.csv"))
+    return int(population.interaction_count.sum() // 2)
+
+
+def bench_ensemble(file_path, iterations):
+    from ensemble import run_ensemble
+    run_ensemble(file_path, replicates=8, iterations=iterations, seed=0)
+    return 8 * len(undirected_edges(load_csr(file_path))) * iterations
+
+
+# {engine: (function, turns or iterations to run)}. A function returns the
+# number of edge-turns played, or (edge-turns, seconds) if it times itself.
+ENGINES = {
+    "load_graph": (bench_load_graph, [0]),
+    "load_csr_cold": (bench_load_csr_cold, [0]),
+    "load_csr_warm": (bench_load_csr_warm, [0]),
+    "tournament": (bench_tournament, [10, 100]),
+    "play_games": (bench_play_games, [10, 100]),
+    "play_game_round": (bench_play_game_round, [10, 100]),
+    "simulate": (bench_simulate, [10, 50]),
+    "ensemble": (bench_ensemble, [10, 50]),
+}
+
+
+def memory_status():
+    """
+    Current and peak resident memory of this process in MB.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            status = dict(line.split(":", 1) for line in f)
+        return int(status["VmRSS"].split()[0]) / 1024, int(status["VmHWM"].split()[0]) / 1024
+    except OSError:  # Not Linux, ru_maxrss is in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak /= 1024 ** 2 if sys.platform == "darwin" else 1024
+        return peak, peak
+
+
+def run_case(engine, file_path, turns, trace_allocations=True):
+    """
+    Run one case in this process and measure it.
+    """
+    function, _ = ENGINES[engine]
+    rss_start, _ = memory_status()
+
+    started = time.perf_counter()
+    played = function(file_path, turns)
+    seconds = time.perf_counter() - started
+    if isinstance(played, tuple):
+        played, seconds = played
+    _, peak_rss = memory_status()
+
+    peak_allocated = None
+    if trace_allocations:
+        tracemalloc.start()
+        function(file_path, turns)
+        peak_allocated = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    return {
+        "engine": engine,
+        "graph": file_path,
+        "turns": turns,
+        "seconds": seconds,
+        "edges_per_second": played / seconds if seconds else float("inf"),
+        "peak_rss_mb": peak_rss,
+        "rss_growth_mb": peak_rss - rss_start,
+        "peak_allocated_mb": peak_allocated,
+    }
+
+
+def run_isolated(engine, file_path, turns, trace_allocations=True):
+    """
+    Run one case in a fresh worker process.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=pool_context()) as pool:
+        return pool.submit(run_case, engine, file_path, turns, trace_allocations).result()
+
+
+def run_benchmarks(engines=None, graphs=None, budget=60.0, trace_allocations=True):
+    """
+    Run every engine over the size ladder, smallest graph first.
+
+    Args:
+        engines (list, optional): Names from ENGINES, all by default.
+        graphs (list, optional): .mtx files ordered by size, GRAPHS by default.
+        budget (float): Seconds after which an engine is not run on larger graphs.
+        trace_allocations (bool): Also measure peak allocations with tracemalloc.
+
+    Returns:
+        list: One dict per case that ran.
+    """
+    results = []
+    for engine in engines or ENGINES:
+        _, turn_counts = ENGINES[engine]
+        for turns in turn_counts:
+            for file_path in graphs or GRAPHS:
+                result = run_isolated(engine, file_path, turns, trace_allocations)
+                results.append(result)
+                print(f"{engine:16} {file_path:28} turns={turns:<4} {result['seconds']:9.3f} s "
+                      f"{result['edges_per_second']:14.0f} edges/s {result['peak_rss_mb']:8.1f} MB")
+                if result["seconds"] > budget:
+                    print(f"{engine} over the {budget:.0f} s budget, skipping larger graphs")
+                    break
+    return results
+
+
+def case_key(result):
+    return result["engine"], result["graph"], result["turns"]
+
+
+def find_regressions(results, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Cases that got slower than the baseline by more than `tolerance`.
+    Cases faster than `min_seconds` in the baseline are too noisy to compare.
+
+    Returns:
+        list: (result, baseline result) pairs.
+    """
+    previous = {case_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None or old["seconds"] < min_seconds:
+            continue
+        if result["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append((result, old))
+    return regressions
+
+
+def write_results(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "numpy": np.__version__, "cpus": os.cpu_count()},
+            "results": results,
+        }, f, indent=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES))
+    parser.add_argument("--graphs", nargs="+")
+    parser.add_argument("--budget", type=float, default=60.0,
+                        help="seconds after which an engine skips larger graphs")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="skip the tracemalloc run of every case")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.engines, args.graphs, args.budget, not args.no_allocations)
+    write_results(args.output, results)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        write_results(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for result, old in regressions:
+            print(f"REGRESSION {result['engine']} {result['graph']} turns={result['turns']}: "
+                  f"{old['seconds']:.3f} s -> {result['seconds']:.3f} s")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
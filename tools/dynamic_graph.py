@@ -0,0 +1,157 @@
+import numpy as np
+
+
+class DynamicGraph:
+    """
+    Undirected graph over a fixed set of nodes built for frequent link changes.
+
+    Edges are kept in a dense (E, 2) array and a dict maps every edge to its
+    slot, so adding, removing and looking up an edge is O(1) and degrees are
+    updated as edges change. Per-edge arrays registered with
+    `add_edge_array` move together with their edge when slots are compacted.
+
+    Args:
+        num_nodes (int): Number of nodes, nodes are the indices 0..num_nodes-1.
+        edges (numpy.ndarray, optional): Initial (E, 2) array of edges.
+    """
+
+    def __init__(self, num_nodes, edges=None):
+        self.num_nodes = num_nodes
+        self.num_edges = 0
+        self.degree = np.zeros(num_nodes, dtype=np.int64)
+        self.slots = {}  # {edge key: slot}, see edge_keys
+        self._edges = np.empty((0, 2), dtype=np.int64)
+        self.edge_data = {}  # {name: array with one row per slot}
+        if edges is not None:
+            self.add_edges(edges)
+
+    @classmethod
+    def from_arrays(cls, num_nodes, edges, edge_data):
+        """
+        Rebuild a graph with its edges in exactly the given slot order, e.g.
+        from a checkpoint. `add_edges` would reorder them.
+
+        Args:
+            num_nodes (int): Number of nodes.
+            edges (numpy.ndarray): (E, 2) array of edges, one per slot.
+            edge_data (dict): {name: per-edge array with E rows}.
+        """
+        graph = cls(num_nodes)
+        graph._edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        graph.num_edges = len(graph._edges)
+        graph.slots = dict(zip(graph.edge_keys(graph._edges).tolist(),
+                               range(graph.num_edges)))
+        graph.degree = np.bincount(graph._edges.ravel(),
+                                   minlength=num_nodes).astype(np.int64)
+        graph.edge_data = {name: np.array(array) for name, array in edge_data.items()}
+        return graph
+
+    @property
+    def edges(self):
+        return self._edges[:self.num_edges]
+
+    def edge_keys(self, edges):
+        """
+        Key of every edge, the same for (u, v) and (v, u).
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        return edges.min(axis=1) * self.num_nodes + edges.max(axis=1)
+
+    def has_edge(self, u, v):
+        return min(u, v) * self.num_nodes + max(u, v) in self.slots
+
+    def add_edge_array(self, name, dtype, shape=()):
+        """
+        Register a per-edge array, new edges start with zeros.
+        """
+        self.edge_data[name] = np.zeros((len(self._edges),) + shape, dtype=dtype)
+
+    def _reserve(self, count):
+        capacity = len(self._edges)
+        if self.num_edges + count <= capacity:
+            return
+        capacity = max(2 * capacity, self.num_edges + count)
+        for name, array in self.edge_data.items():
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.num_edges] = array[:self.num_edges]
+            self.edge_data[name] = grown
+        grown = np.empty((capacity, 2), dtype=np.int64)
+        grown[:self.num_edges] = self.edges
+        self._edges = grown
+
+    def add_edges(self, edges):
+        """
+        Add a batch of edges. Self loops, duplicates and existing edges are skipped.
+
+        Returns:
+            numpy.ndarray: The edges that were added.
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        keys, first = np.unique(self.edge_keys(edges), return_index=True)
+        new = np.array([key not in self.slots for key in keys.tolist()], dtype=bool)
+        keys, edges = keys[new], edges[first[new]]
+
+        self._reserve(len(edges))
+        start, stop = self.num_edges, self.num_edges + len(edges)
+        self._edges[start:stop] = edges
+        for array in self.edge_data.values():
+            array[start:stop] = 0
+        self.slots.update(zip(keys.tolist(), range(start, stop)))
+        np.add.at(self.degree, edges.ravel(), 1)
+        self.num_edges = stop
+        return edges
+
+    def remove_slots(self, slots):
+        """
+        Remove the edges stored in the given slots.
+
+        The last edges are moved into the freed slots, so the cost is
+        proportional to the number of removed edges.
+        """
+        slots = np.unique(np.asarray(slots, dtype=np.int64))
+        if not len(slots):
+            return
+        removed = self.edges[slots]
+        for key in self.edge_keys(removed).tolist():
+            del self.slots[key]
+        np.subtract.at(self.degree, removed.ravel(), 1)
+
+        remaining = self.num_edges - len(slots)
+        tail = np.arange(remaining, self.num_edges)
+        movers = tail[~np.isin(tail, slots)]
+        holes = slots[slots < remaining]
+        self._edges[holes] = self._edges[movers]
+        for array in self.edge_data.values():
+            array[holes] = array[movers]
+        self.slots.update(zip(self.edge_keys(self._edges[holes]).tolist(),
+                              holes.tolist()))
+        self.num_edges = remaining
+
+    def remove_edges(self, edges):
+        """
+        Remove a batch of edges, edges that do not exist are ignored.
+        """
+        slots = [self.slots[key] for key in self.edge_keys(edges).tolist()
+                 if key in self.slots]
+        self.remove_slots(slots)
+
+    def random_non_neighbor(self, node, rng, max_tries=64):
+        """
+        Draw a random node that is not `node` and not one of its neighbours.
+
+        Uses rejection sampling, which takes O(1) draws unless the node is
+        connected to most of the graph; then falls back to a full scan.
+
+        Returns:
+            int or None: The node drawn, None if `node` is connected to everyone.
+        """
+        if self.degree[node] >= self.num_nodes - 1:
+            return None
+        for _ in range(max_tries):
+            candidate = int(rng.integers(self.num_nodes))
+            if candidate != node and not self.has_edge(node, candidate):
+                return candidate
+        candidates = [n for n in range(self.num_nodes)
+                      if n != node and not self.has_edge(node, n)]
+        return int(rng.choice(candidates))
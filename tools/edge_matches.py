@@ -0,0 +1,71 @@
+import axelrod as axl
+
+from match_cycles import CycleFinder
+
+
+class EdgeMatches:
+    """
+    One running Iterated Prisoner's Dilemma match per edge of a graph.
+
+    The players of every edge are created once and keep their history, so
+    the next round costs exactly one turn per edge instead of replaying the
+    whole match. Once the match of a deterministic pairing enters a cycle
+    (see match_cycles), its next turns are read from the cycle without
+    playing; the players' histories then stop growing.
+
+    Args:
+        graph (networkx.Graph): Graph with a strategy class in the 'strategy' attribute of every node.
+        turns (int): Number of rounds that will be played, players see it as the match length.
+        seed (int, optional): Seed for the stochastic players.
+    """
+
+    def __init__(self, graph, turns, seed=None):
+        self.game = axl.Game()  # Define the game scoring
+        self.turn = 0  # Number of rounds played so far
+        self.matches = {}
+        self.finders = {}  # {edge: CycleFinder} of deterministic matches
+        self.cycles = {}  # {edge: scores of the turns of the cycle}
+
+        seeds = axl.RandomGenerator(seed)
+        for u, v in graph.edges():
+            players = (graph.nodes[u]['strategy'](), graph.nodes[v]['strategy']())
+            match = axl.Match(players, turns=turns, game=self.game)
+            for player in players:
+                player.set_match_attributes(**match.match_attributes)
+                # Stochastic players keep their own random stream between rounds
+                if axl.Classifiers["stochastic"](player):
+                    player.set_seed(seeds.random_seed_int())
+            self.matches[(u, v)] = match
+            finder = CycleFinder(graph.nodes[u]['strategy'], graph.nodes[v]['strategy'])
+            if finder.enabled:
+                self.finders[(u, v)] = finder
+
+    def step(self):
+        """
+        Play one more turn on every edge.
+
+        Returns:
+            dict: Scores of the turn, {(u, v): (score_u, score_v)}.
+        """
+        scores = {}
+        for edge, match in self.matches.items():
+            cycle = self.cycles.get(edge)
+            if cycle is not None:
+                scores[edge] = cycle[self.turn % len(cycle)]
+                continue
+            finder = self.finders.get(edge)
+            if finder is not None:
+                found = finder.observe(*match.players)
+                if found is not None:
+                    start, period = found
+                    # Rotated so that turn t scores cycle[t % period]
+                    cycle = [finder.scores[start + (t - start) % period] for t in range(period)]
+                    self.cycles[edge] = cycle
+                    del self.finders[edge]
+                    scores[edge] = cycle[self.turn % period]
+                    continue
+            scores[edge] = self.game.score(match.simultaneous_play(*match.players))
+            if finder is not None:
+                finder.record(scores[edge])
+        self.turn += 1
+        return scores
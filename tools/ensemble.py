@@ -0,0 +1,453 @@
+"""
+Monte Carlo ensembles of the spatial game, K replicates in one pass.
+
+Every replicate gets its own random strategy assignment and random draws,
+but all of them start from the loaded graph. Agent arrays have shape (K, N)
+and the links of replicate r fill the first num_edges[r] slots of its row of
+a (K, C, 2) array, with the pair memory alongside, so one NumPy call
+advances all replicates at once.
+
+The rules are the ones of vectorized_simulation (decisions, payoffs,
+reputation, strategy adoption, link breaking and preferential attachment,
+with the same DEFAULT_PARAMS): every replicate rewires its own links and is
+distributed like a run of `simulate`. The draws come in another order, so
+a replicate is not the run of `simulate` with the same seed, except with
+one replicate and `rewiring=False`.
+"""
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from strategy_states import (ACTION_TABLE, BY_REPUTATION, COOPERATE, DEFECT,
+                             NEXT_STATE, NUM_STATES, START_STATE,
+                             STRATEGIES)
+from vectorized_simulation import (PAYOFF_TABLE, REPUTATION_STEP, graph_arrays,
+                                   run_params)
+
+# NEXT_STATE indexed by [state, 2 * my action + opponent action]
+OUTCOME_NEXT_STATE = NEXT_STATE.reshape(NUM_STATES, 4)
+# Links of the replicates advanced together by run_ensemble. More replicates
+# per call save Python overhead on small graphs, but past a few hundred
+# thousand links the arrays leave the cache and every replicate gets slower.
+BLOCK_LINKS = 1 << 19
+
+
+def contains(keys, values):
+    """
+    Whether every value is in the sorted array `keys`.
+    """
+    index = np.minimum(np.searchsorted(keys, values), max(len(keys) - 1, 0))
+    return keys[index] == values if len(keys) else np.zeros(np.shape(values), dtype=bool)
+
+
+def draw_non_neighbors(ensemble, replicate, nodes, max_tries=64):
+    """
+    Draw a random node for every node that is not itself and not one of its
+    neighbours in its replicate, see DynamicGraph.random_non_neighbor.
+
+    Args:
+        ensemble (Ensemble): Links of every replicate.
+        replicate (numpy.ndarray): Replicate of every node.
+        nodes (numpy.ndarray): Nodes looking for a new friend.
+        max_tries (int): Rejection rounds before a full scan.
+
+    Returns:
+        numpy.ndarray: The node drawn for every node, -1 for nodes that are
+        connected to everyone.
+    """
+    e = ensemble
+
+    def free(replicate, node, other):
+        return (node != other) & ~contains(e.keys, e.link_keys(replicate, node, other))
+
+    friends = np.full(len(nodes), -1, dtype=np.int64)
+    pending = np.arange(len(nodes))
+    for _ in range(max_tries):
+        if not len(pending):
+            break
+        candidate = e.rng.integers(e.num_nodes, size=len(pending))
+        found = free(replicate[pending], nodes[pending], candidate)
+        friends[pending[found]] = candidate[found]
+        pending = pending[~found]
+    for index in pending:  # Connected to most of the graph
+        candidates = np.flatnonzero(free(replicate[index], nodes[index], np.arange(e.num_nodes)))
+        if len(candidates):
+            friends[index] = e.rng.choice(candidates)
+    return friends
+
+
+class Ensemble:
+    """
+    State of K replicates of the game starting from one graph.
+
+    The links of replicate r are stored like in DynamicGraph: in the first
+    num_edges[r] slots of its row of `edges`, removing a link moves the last
+    link of the row into its slot. Per-link arrays share that layout and the
+    free slots at the end of a row hold zeros.
+
+    Args:
+        nodes (list): Node labels.
+        edges (numpy.ndarray): Undirected edges as an (E, 2) array of node indices.
+        replicates (int): Number of replicates K.
+        rng (numpy.random.Generator): Random generator used for every draw.
+        params (dict, optional): Overrides of vectorized_simulation.DEFAULT_PARAMS.
+    """
+
+    def __init__(self, nodes, edges, replicates, rng, params=None):
+        self.nodes = list(nodes)
+        self.num_nodes = len(self.nodes)
+        self.replicates = replicates
+        self.rng = rng
+        self.params = run_params(params)
+
+        # Every link once, like DynamicGraph.add_edges
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        keys, first = np.unique(self.link_keys(0, edges[:, 0], edges[:, 1]), return_index=True)
+        edges = edges[first]
+
+        self.edges = np.repeat(edges[None], replicates, axis=0)
+        self.num_edges = np.full(replicates, len(edges))
+        # Sorted link_keys of the links of all replicates
+        self.keys = (np.arange(replicates)[:, None] * self.num_nodes ** 2 + keys).ravel()
+        self.degree = np.repeat(np.bincount(edges.ravel(), minlength=self.num_nodes)[None],
+                                replicates, axis=0)
+        self.state = np.full(self.edges.shape, START_STATE, dtype=np.uint16)
+        self.defection_count = np.zeros(self.edges.shape, dtype=np.int32)
+        self.settled = np.zeros(self.edges.shape[:2], dtype=bool)
+        self._owner = None
+
+        shape = (replicates, self.num_nodes)
+        if self.params["strategy_mix"] is None:
+            self.strategy = rng.integers(len(STRATEGIES), size=shape).astype(np.int8)
+        else:
+            self.strategy = rng.choice(len(STRATEGIES), size=shape,
+                                       p=self.params["strategy_mix"]).astype(np.int8)
+        self.score = np.zeros(shape, dtype=np.int64)
+        self.interaction_count = np.zeros(shape, dtype=np.int64)
+        self.reputation = np.ones(shape)
+        self.cooperation_count = np.zeros(shape, dtype=np.int64)
+
+    def link_keys(self, replicate, first, second):
+        """
+        Key replicate * N^2 + min * N + max of the link between two nodes.
+        """
+        return ((np.asarray(replicate) * self.num_nodes + np.minimum(first, second)) *
+                self.num_nodes + np.maximum(first, second))
+
+    @property
+    def active(self):
+        """
+        (K, C) mask of the slots holding a link.
+        """
+        return np.arange(self.edges.shape[1]) < self.num_edges[:, None]
+
+    @property
+    def owner_size(self):
+        # One bin per replicate and node, and a last one for the free slots
+        return self.replicates * self.num_nodes + 1
+
+    @property
+    def owner(self):
+        """
+        Flat index replicate * N + node of both ends of every link as a
+        (2, K, C) array, owner_size - 1 for the ends of free slots.
+        """
+        if self._owner is None:
+            owner = np.ascontiguousarray(np.moveaxis(self.edges, 2, 0))
+            owner += np.arange(self.replicates)[:, None] * self.num_nodes
+            owner[:, ~self.active] = self.owner_size - 1
+            self._owner = owner
+        return self._owner
+
+    def outcome_counts(self, owner, outcome):
+        """
+        Count outcome codes 0..3 over the links of every node.
+
+        Args:
+            owner (numpy.ndarray): Flat index replicate * N + node of the
+                player of every outcome.
+            outcome (numpy.ndarray): Outcome codes, same shape as `owner`.
+
+        Returns:
+            numpy.ndarray: (K, N, 4) counts.
+        """
+        counts = np.bincount(owner.ravel() * 4 + outcome.ravel(),
+                             minlength=4 * self.replicates * self.num_nodes)
+        return counts.reshape(self.replicates, self.num_nodes, 4)
+
+    def average_payoff(self):
+        average = np.zeros(self.score.shape)
+        np.divide(self.score, self.interaction_count,
+                  out=average, where=self.interaction_count > 0)
+        return average
+
+    def _resize(self, capacity):
+        kept = min(capacity, self.edges.shape[1])
+        for name in ("edges", "state", "defection_count", "settled"):
+            array = getattr(self, name)
+            resized = np.zeros((self.replicates, capacity) + array.shape[2:], dtype=array.dtype)
+            resized[:, :kept] = array[:, :kept]
+            setattr(self, name, resized)
+        self.state[:, kept:] = START_STATE
+        self._owner = None
+
+    def _reserve(self, count):
+        # Every per-link operation runs over all slots, so rows only get an
+        # eighth longer than needed and are cut when a quarter is unused
+        capacity = self.edges.shape[1]
+        used = self.num_edges.max(initial=0) + count
+        if used > capacity:
+            self._resize(max(used, capacity + capacity // 8))
+        elif 4 * used < 3 * capacity:
+            self._resize(used + used // 8)
+
+    def remove_slots(self, replicate, slot):
+        """
+        Remove the links stored in the given slots, given sorted by
+        (replicate, slot) without duplicates. The last links of every row
+        are moved into the freed slots, see DynamicGraph.remove_slots.
+        """
+        removed = self.edges[replicate, slot]
+        np.subtract.at(self.degree, (np.repeat(replicate, 2), removed.ravel()), 1)
+        self.keys = np.delete(self.keys, np.searchsorted(
+            self.keys, self.link_keys(replicate, removed[:, 0], removed[:, 1])))
+
+        capacity = self.edges.shape[1]
+        count = np.bincount(replicate, minlength=self.replicates)
+        remaining = self.num_edges - count
+        # Last count[r] slots of every row, in (replicate, slot) order
+        tail_replicate = np.repeat(np.arange(self.replicates), count)
+        tail_slot = (np.arange(len(tail_replicate)) - np.repeat(np.cumsum(count) - count, count) +
+                     remaining[tail_replicate])
+        moving = ~contains(replicate * capacity + slot, tail_replicate * capacity + tail_slot)
+        holes = slot < remaining[replicate]
+        source = tail_replicate[moving], tail_slot[moving]
+        target = replicate[holes], slot[holes]
+        arrays = [self.edges, self.state, self.defection_count, self.settled]
+        for array in arrays:
+            array[target] = array[source]
+        if self._owner is not None:
+            self._owner[:, target[0], target[1]] = self._owner[:, source[0], source[1]]
+            self._owner[:, tail_replicate, tail_slot] = self.owner_size - 1
+        for array in arrays:
+            array[tail_replicate, tail_slot] = 0
+        self.state[tail_replicate, tail_slot] = START_STATE
+        self.num_edges = remaining
+
+    def add_edges(self, replicate, edges):
+        """
+        Add links that do not exist yet, given without duplicates and sorted
+        by replicate.
+        """
+        count = np.bincount(replicate, minlength=self.replicates)
+        self._reserve(count.max(initial=0))
+        slot = (self.num_edges[replicate] + np.arange(len(replicate)) -
+                np.searchsorted(replicate, replicate))
+        self.edges[replicate, slot] = edges
+        if self._owner is not None:
+            self._owner[:, replicate, slot] = replicate * self.num_nodes + edges.T
+        np.add.at(self.degree, (np.repeat(replicate, 2), edges.ravel()), 1)
+        keys = self.link_keys(replicate, edges[:, 0], edges[:, 1])
+        self.keys = np.insert(self.keys, np.searchsorted(self.keys, keys), keys)
+        self.num_edges += count
+
+
+def play_iteration(ensemble):
+    """
+    Play one turn on every link of every replicate.
+
+    Like vectorized_simulation.play_iteration, only the links that are not
+    settled are decided; a settled link adds payoff 3 and one cooperation to
+    both ends until one of them switches strategy.
+    """
+    e = ensemble
+    replicate, slot = np.nonzero(e.active & ~e.settled)
+    edges = e.edges[replicate, slot]
+    state = e.state[replicate, slot]
+    actions = ACTION_TABLE[e.strategy[replicate[:, None], edges], state]
+    fresh = actions == BY_REPUTATION
+    if fresh.any():
+        row, side = np.nonzero(fresh)
+        opponent = edges[row, 1 - side]
+        actions[fresh] = e.rng.random(len(row)) >= e.reputation[replicate[row], opponent]
+
+    # Outcome code 2 * my action + opponent action, everything below is
+    # derived from how often each node saw each outcome
+    outcome = 2 * actions + actions[:, ::-1]
+    owner = replicate[:, None] * e.num_nodes + edges
+    counts = e.outcome_counts(owner, outcome)
+    settled_degree = e.degree - np.bincount(owner.ravel(), minlength=e.degree.size
+                                            ).reshape(e.degree.shape)
+    cooperated = counts[..., 2 * COOPERATE] + counts[..., 2 * COOPERATE + 1] + settled_degree
+    e.score += counts @ PAYOFF_TABLE.ravel() + PAYOFF_TABLE[COOPERATE, COOPERATE] * settled_degree
+    e.interaction_count += e.degree
+    e.cooperation_count += cooperated
+
+    next_state = OUTCOME_NEXT_STATE[state, outcome]
+    e.state[replicate, slot] = next_state
+    e.defection_count[replicate, slot] += actions == DEFECT
+    e.settled[replicate, slot] = ((actions[:, 0] == COOPERATE) & (actions[:, 1] == COOPERATE) &
+                                  (next_state[:, 0] == state[:, 0]) &
+                                  (next_state[:, 1] == state[:, 1]))
+
+    net = 2 * cooperated - e.degree
+    scale = np.exp(-e.params["reputation_decay"] * e.degree)
+    np.clip(e.reputation + REPUTATION_STEP * scale * net, 0.0, 1.0,
+            out=e.reputation)
+
+
+def adapt_strategies(ensemble, current_iteration):
+    """
+    Adopt the strategy of the best neighbour, see vectorized_simulation.
+    """
+    if current_iteration < ensemble.params["adaptation_warmup"]:
+        return
+
+    e = ensemble
+    played = e.interaction_count > 0
+    neighbor_avg = np.full(e.owner_size, -np.inf)
+    np.divide(e.score, e.interaction_count, out=neighbor_avg[:-1].reshape(e.score.shape),
+              where=played)
+    neighbor_avg[-1] = np.nan  # Free slots are never the best
+    my_avg = e.score / (e.interaction_count + 1e-6)
+
+    # Segmented max over both directions of every link, as in vectorized_simulation
+    owner = e.owner.ravel()
+    neighbors = np.concatenate([e.owner[1].ravel(), e.owner[0].ravel()])
+    friend_avg = neighbor_avg[neighbors]
+    best_avg = np.full(e.owner_size, -np.inf)
+    with np.errstate(invalid="ignore"):
+        np.maximum.at(best_avg, owner, friend_avg)
+    # Lowest-index neighbour reaching the best average, agents without
+    # friends point to themselves
+    hits = friend_avg == best_avg[owner]
+    best_neighbor = np.full(e.owner_size, e.owner_size)
+    np.minimum.at(best_neighbor, owner[hits], neighbors[hits])
+    best_neighbor = best_neighbor[:-1]
+    lonely = best_neighbor == e.owner_size
+    best_neighbor[lonely] = np.flatnonzero(lonely)
+
+    payoff_diff = best_avg[:-1].reshape(e.score.shape) - my_avg
+    prob = np.minimum(1.0, payoff_diff / (my_avg + 1e-6))
+    adopt = (payoff_diff > 0) & (e.rng.random(e.score.shape) < prob)
+    new_strategy = np.where(adopt, e.strategy.ravel()[best_neighbor].reshape(e.score.shape),
+                            e.strategy)
+    switched = np.zeros(e.owner_size, dtype=bool)
+    switched[:-1] = (new_strategy != e.strategy).ravel()
+    if switched.any():
+        # Their links are decided again in the next play
+        e.settled[switched[e.owner[0]] | switched[e.owner[1]]] = False
+    e.strategy = new_strategy
+
+
+def rewire(ensemble):
+    """
+    Break links based on defections and create new ones by preferential
+    attachment in every replicate, see vectorized_simulation.rewire.
+
+    Returns:
+        tuple: Number of links broken and created in every replicate.
+    """
+    e = ensemble
+    # Each endpoint breaks the link with probability own defections / link_break_scale
+    replicate, slot, side = np.nonzero(e.defection_count)
+    defections = e.defection_count[replicate, slot, side]
+    breaks = e.rng.random(len(slot)) < defections / e.params["link_break_scale"]
+    capacity = e.edges.shape[1]
+    replicate, slot = np.divmod(np.unique(replicate[breaks] * capacity + slot[breaks]), capacity)
+
+    # Friends are picked from the links at the start of the rewiring phase
+    prob_create = e.params["attachment_scale"] * e.degree / (e.num_nodes + 1e-6)
+    creator_replicate, creators = np.nonzero(e.rng.random(e.degree.shape) < prob_create)
+    friends = draw_non_neighbors(e, creator_replicate, creators)
+    found = friends >= 0
+    creator_replicate, creators, friends = (creator_replicate[found], creators[found],
+                                            friends[found])
+    # Two agents may have picked each other, the link is added once. Sorted
+    # by key, the links are sorted by replicate.
+    _, first = np.unique(e.link_keys(creator_replicate, creators, friends), return_index=True)
+
+    e.remove_slots(replicate, slot)
+    e.add_edges(creator_replicate[first], np.stack([creators, friends], axis=1)[first])
+    return (np.bincount(replicate, minlength=e.replicates),
+            np.bincount(creator_replicate[first], minlength=e.replicates))
+
+
+def replicate_table(ensemble):
+    """
+    Per replicate and strategy: share of agents, average payoff per
+    interaction and cooperation rate of the agents using it at the end.
+    """
+    e = ensemble
+    num_strategies = len(STRATEGIES)
+    group = (np.arange(e.replicates)[:, None] * num_strategies + e.strategy).ravel()
+    size = e.replicates * num_strategies
+
+    def total(values):
+        return np.bincount(group, weights=values.ravel(), minlength=size)
+
+    agents = total(np.ones(e.score.shape))
+    interactions = total(e.interaction_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frame = pd.DataFrame({
+            "replicate": np.repeat(np.arange(e.replicates), num_strategies),
+            "strategy": np.tile(STRATEGIES, e.replicates),
+            "share": agents / e.num_nodes,
+            "score": np.where(interactions > 0, total(e.score) / interactions, np.nan),
+            "cooperation": np.where(interactions > 0,
+                                    total(e.cooperation_count) / interactions, np.nan),
+        })
+    return frame
+
+
+def summarize(frame):
+    """
+    Mean and standard deviation over replicates of every column of replicate_table.
+    """
+    summary = frame.drop(columns="replicate").groupby("strategy", sort=False).agg(["mean", "std"])
+    summary.columns = [f"{column}_{stat}" for column, stat in summary.columns]
+    return summary
+
+
+def run_ensemble(graph, replicates=32, iterations=100, seed=None, rewiring=True, params=None):
+    """
+    Run `replicates` independent games from one graph, loaded and indexed once.
+
+    Args:
+        graph (networkx.Graph or str): Friendship graph or path of a .mtx file.
+        replicates (int): Number of replicates K.
+        iterations (int): Number of iterations of every replicate.
+        seed (int, optional): Seed of the random generator of the whole ensemble.
+        rewiring (bool): Break and create links in every replicate, as in
+            simulate. Without it the replicates play on the fixed loaded graph.
+        params (dict, optional): Overrides of vectorized_simulation.DEFAULT_PARAMS.
+
+    Returns:
+        tuple: (summary, replicates) DataFrames, the per-strategy mean/std of
+        share, score and cooperation rate, and the values of every replicate.
+    """
+    nodes, edges = graph_arrays(graph)
+    rng = np.random.default_rng(seed)
+    # Replicates run in blocks of about BLOCK_LINKS links
+    block = max(1, BLOCK_LINKS // max(len(edges), 1))
+    sizes = [min(block, replicates - start) for start in range(0, replicates, block)]
+    frames = []
+    with tqdm(total=len(sizes) * iterations) as progress:
+        for size in sizes:
+            ensemble = Ensemble(nodes, edges, size, rng, params)
+            for iteration in range(iterations):
+                play_iteration(ensemble)
+                adapt_strategies(ensemble, iteration)
+                if rewiring:
+                    rewire(ensemble)
+                progress.update()
+            frame = replicate_table(ensemble)
+            frame["replicate"] += sum(len(frame) for frame in frames) // len(STRATEGIES)
+            frames.append(frame)
+    frame = pd.concat(frames, ignore_index=True)
+    return summarize(frame), frame
+
+if __name__ == "__main__":
+    summary, _ = run_ensemble("fb_graph/matname.mtx", replicates=32, iterations=100)
+    print(summary.round(3))
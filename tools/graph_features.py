@@ -0,0 +1,138 @@
+"""
+Per-node graph features cached next to the graph file.
+
+Degree, triangle count, local clustering coefficient, connected component
+and k-core number of every node are computed once per graph file with
+sparse-matrix algorithms and kept in fb_graph/<name>.features.npz. The cache
+records a hash of the .mtx file and is rebuilt when the content changes.
+Loading memory-maps the arrays, so a lookup is one array index per node:
+
+    features = load_features("fb_graph/matname.mtx")
+    features["clustering"][node]  # node is the 0-based node index
+"""
+import hashlib
+import os
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from graph_loader import load_csr, memmap_npz, num_nodes
+
+# Bump when the features or their definition change
+FEATURES_VERSION = 2
+FEATURES = ["degree", "triangles", "clustering", "component", "core"]
+
+
+def features_path(file_path):
+    """
+    Path of the feature cache of a .mtx file (fb_graph/matname.mtx -> fb_graph/matname.features.npz).
+    """
+    return os.path.splitext(file_path)[0] + ".features.npz"
+
+
+def file_hash(file_path):
+    """
+    SHA-256 of a file's content as a uint8 array, prefixed with FEATURES_VERSION.
+    """
+    digest = hashlib.sha256(str(FEATURES_VERSION).encode())
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return np.frombuffer(digest.digest(), dtype=np.uint8)
+
+
+def adjacency_matrix(csr):
+    """
+    Symmetric adjacency of a graph_loader CSR as a scipy sparse array.
+    """
+    size = num_nodes(csr)
+    return sparse.csr_array(
+        (np.ones(len(csr["indices"]), dtype=np.int64),
+         np.asarray(csr["indices"]), np.asarray(csr["indptr"])),
+        shape=(size, size))
+
+
+def triangle_counts(adjacency, block_size=1024):
+    """
+    Number of triangles through every node, the diagonal of A^3 / 2.
+
+    (A @ A) * A counts the common neighbours of every linked pair; it is
+    computed for a block of rows at a time to bound memory.
+    """
+    size = adjacency.shape[0]
+    triangles = np.zeros(size, dtype=np.int64)
+    for start in range(0, size, block_size):
+        rows = adjacency[start:start + block_size]
+        triangles[start:start + block_size] = (rows @ adjacency).multiply(rows).sum(axis=1)
+    return triangles // 2
+
+
+def core_numbers(adjacency, degree):
+    """
+    k-core number of every node by peeling all nodes of minimum degree at once.
+    """
+    degree = degree.copy()
+    core = np.zeros(len(degree), dtype=np.int64)
+    alive = np.ones(len(degree), dtype=bool)
+    k = 0
+    while alive.any():
+        k = max(k, degree[alive].min())
+        peel = alive & (degree <= k)
+        while peel.any():
+            core[peel] = k
+            alive &= ~peel
+            degree -= adjacency @ peel.astype(np.int64)
+            peel = alive & (degree <= k)
+    return core
+
+
+def compute_features(file_path):
+    """
+    Compute all FEATURES of a .mtx file, indexed by the 0-based node index.
+    """
+    adjacency = adjacency_matrix(load_csr(file_path))
+    degree = np.diff(adjacency.indptr).astype(np.int64)
+    triangles = triangle_counts(adjacency)
+    pairs = degree * (degree - 1)
+    clustering = np.zeros(len(degree))
+    np.divide(2 * triangles, pairs, out=clustering, where=pairs > 0)
+    _, component = csgraph.connected_components(adjacency, directed=False)
+    return {
+        "degree": degree,
+        "triangles": triangles,
+        "clustering": clustering,
+        "component": component.astype(np.int64),
+        "core": core_numbers(adjacency, degree),
+    }
+
+
+def load_features(file_path):
+    """
+    Load the cached features of a .mtx file, computing them first if the
+    cache is missing or was built from a different file content.
+
+    Returns:
+        dict: {feature name: memory-mapped array with one value per node}.
+    """
+    path = features_path(file_path)
+    source_hash = file_hash(file_path)
+    if os.path.exists(path):
+        arrays = memmap_npz(path)
+        if np.array_equal(arrays.get("source_hash"), source_hash):
+            return {name: arrays[name] for name in FEATURES}
+
+    features = compute_features(file_path)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, source_hash=source_hash, **features)
+    os.replace(path + ".tmp", path)
+    arrays = memmap_npz(path)
+    return {name: arrays[name] for name in FEATURES}
+
+
+def component_nodes(features, node):
+    """
+    0-based indices of all nodes in the connected component of `node`.
+    """
+    component = features["component"]
+    return np.flatnonzero(component == component[node])
@@ -0,0 +1,262 @@
+import os
+import struct
+import zipfile
+
+import networkx as nx
+import numpy as np
+
+# Bump when the layout of the cache files changes
+CACHE_VERSION = 1
+
+
+def cache_path(file_path):
+    """
+    Path of the CSR cache kept next to a .mtx file (fb_graph/matname.mtx -> fb_graph/matname.npz).
+    """
+    return os.path.splitext(file_path)[0] + ".npz"
+
+
+def source_stamp(file_path):
+    """
+    Identify the version of a source file by its size and modification time.
+    """
+    stat = os.stat(file_path)
+    return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def read_mtx_edges(file_path):
+    """
+    Parse a MatrixMarket coordinate file with vectorized I/O.
+
+    Args:
+        file_path (str): Path to the .mtx file.
+
+    Returns:
+        tuple: (num_nodes, edges) where edges is an (E, 2) int64 array of
+        0-based node indices in file order.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+
+    # Skip comment lines, the first other line holds the matrix size
+    start = 0
+    while data.startswith(b'%', start):
+        start = data.index(b'\n', start) + 1
+    end = data.find(b'\n', start)
+    end = len(data) if end == -1 else end
+    num_rows, num_cols = map(int, data[start:end].split()[:2])
+
+    body = data[end + 1:]
+    first_line = body.split(b'\n', 1)[0].split()
+    num_columns = max(len(first_line), 2)
+    values = np.fromstring(body.decode('ascii'), dtype=np.float64, sep=' ')
+    entries = values.reshape(-1, num_columns)[:, :2].astype(np.int64)
+    return max(num_rows, num_cols), entries - 1
+
+
+def mtx_header(file_path):
+    """
+    Read only the header of a MatrixMarket coordinate file.
+
+    Returns:
+        tuple: (num_nodes, num_entries, offset) where offset is the byte
+        position of the first entry.
+    """
+    with open(file_path, 'rb') as f:
+        line = f.readline()
+        while line.startswith(b'%'):
+            line = f.readline()
+        num_rows, num_cols, num_entries = map(int, line.split()[:3])
+        return max(num_rows, num_cols), num_entries, f.tell()
+
+
+def edge_file_path(file_path):
+    """
+    Path of the binary edge list of a .mtx file (fb_graph/matname.mtx -> fb_graph/matname.edges.npy).
+    """
+    return os.path.splitext(file_path)[0] + ".edges.npy"
+
+
+def convert_edges(file_path, block_size=1 << 24):
+    """
+    Write the entries of a .mtx file to an (E, 2) int32 .npy file of 0-based
+    node indices, in file order. The file is parsed in blocks of
+    `block_size` bytes, so graphs larger than the memory can be converted.
+    """
+    num_nodes, num_entries, offset = mtx_header(file_path)
+    path = edge_file_path(file_path)
+    tmp_path = path + '.tmp'
+    edges = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.int32, shape=(num_entries, 2))
+    filled, num_columns, rest = 0, None, b''
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            block = f.read(block_size)
+            data = rest + block
+            if block:
+                # Keep the last, maybe partial, line for the next block
+                cut = data.rfind(b'\n') + 1
+                data, rest = data[:cut], data[cut:]
+            if data.strip():
+                if num_columns is None:
+                    num_columns = max(len(data.lstrip().split(b'\n', 1)[0].split()), 2)
+                values = np.fromstring(data.decode('ascii'), dtype=np.float64, sep=' ')
+                entries = values.reshape(-1, num_columns)[:, :2].astype(np.int64) - 1
+                edges[filled:filled + len(entries)] = entries
+                filled += len(entries)
+            if not block:
+                break
+    if filled != num_entries:
+        raise ValueError(f"{file_path} has {filled} entries, its header says {num_entries}.")
+    edges.flush()
+    del edges
+    os.replace(tmp_path, path)
+
+
+def load_edge_file(file_path):
+    """
+    Memory-map the binary edge list of a .mtx file, converting it first if
+    it is missing or older than the .mtx file.
+
+    Returns:
+        numpy.memmap: (E, 2) int32 node indices, see convert_edges.
+    """
+    path = edge_file_path(file_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(file_path):
+        convert_edges(file_path)
+    return np.load(path, mmap_mode='r')
+
+
+def edges_to_csr(num_nodes, edges):
+    """
+    Symmetric CSR adjacency (indptr, indices) of an undirected edge list.
+    Self loops and duplicate edges are dropped.
+    """
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    owner = np.concatenate([edges[:, 0], edges[:, 1]])
+    other = np.concatenate([edges[:, 1], edges[:, 0]])
+    keys = np.unique(owner * num_nodes + other)
+    owner, indices = np.divmod(keys, num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=num_nodes), out=indptr[1:])
+    return indptr, indices.astype(np.int32)
+
+
+def memmap_npz(file_path):
+    """
+    Memory-map the arrays of an uncompressed .npz file.
+
+    Returns:
+        dict: {array name: read-only numpy.memmap}
+    """
+    arrays = {}
+    with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{file_path} is compressed and cannot be memory-mapped.")
+            # The array data follows the local file header and the .npy header
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-len('.npy')]
+            if np.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(
+                file_path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                order='F' if fortran_order else 'C')
+    return arrays
+
+
+def build_cache(file_path):
+    """
+    Parse a .mtx file and write its CSR cache next to it.
+    """
+    num_nodes, edges = read_mtx_edges(file_path)
+    indptr, indices = edges_to_csr(num_nodes, edges)
+
+    path = cache_path(file_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, indptr=indptr, indices=indices, edges=edges,
+                 stamp=source_stamp(file_path))
+    # Readers never see a half-written cache
+    os.replace(tmp_path, path)
+
+
+def load_csr(file_path):
+    """
+    Load the graph of a .mtx file from its memory-mapped CSR cache,
+    building the cache first if it is missing or out of date.
+
+    Args:
+        file_path (str): Path to the .mtx file.
+
+    Returns:
+        dict: 'indptr' and 'indices' (symmetric CSR adjacency over 0-based
+        node indices) and 'edges' (the file's edges in file order).
+    """
+    path = cache_path(file_path)
+    if os.path.exists(path):
+        arrays = memmap_npz(path)
+        if np.array_equal(arrays.get('stamp'), source_stamp(file_path)):
+            return arrays
+    build_cache(file_path)
+    return memmap_npz(path)
+
+
+def num_nodes(csr):
+    return len(csr['indptr']) - 1
+
+
+def undirected_edges(csr):
+    """
+    Every undirected edge of a CSR adjacency once, as an (E, 2) array with u < v.
+    """
+    indptr, indices = csr['indptr'], csr['indices']
+    owner = np.repeat(np.arange(num_nodes(csr)), np.diff(indptr))
+    upper = owner < indices
+    return np.stack([owner[upper], indices[upper]], axis=1).astype(np.int64)
+
+
+def load_graph(file_path):
+    """
+    Same graph as nx.Graph(scipy.io.mmread(file_path)): nodes are the 0-based
+    indices of all rows of the matrix.
+    """
+    csr = load_csr(file_path)
+    graph = nx.Graph()
+    graph.add_nodes_from(range(num_nodes(csr)))
+    graph.add_edges_from(undirected_edges(csr).tolist())
+    return graph
+
+
+def load_graph_with_names(file_path, max_edges=None, name_format="Player {}"):
+    """
+    Load a graph from a MatrixMarket coordinate pattern file and assign player names.
+
+    Nodes keep the 1-based ids of the file and only nodes with an edge are added.
+
+    Args:
+        file_path (str): Path to the .mtx file.
+        max_edges (int, optional): Maximum number of edges to load. If None, load all edges.
+        name_format (str): Format of the 'name' attribute, filled with the node id.
+    """
+    edges = np.asarray(load_csr(file_path)['edges'])
+    # If max_edges is specified, limit the number of edges
+    if max_edges is not None:
+        edges = edges[:max_edges]
+
+    # Create a graph and label nodes with "Player X"
+    G = nx.Graph()
+    G.add_edges_from((edges + 1).tolist())
+    for node in G.nodes():
+        G.nodes[node]['name'] = name_format.format(node)
+        G.nodes[node]['score'] = 0  # Initialize scores
+    return G
@@ -0,0 +1,104 @@
+import networkx as nx
+import numpy as np
+from PIL import Image
+
+
+class GraphRenderer:
+    """
+    Draw a graph once and update only node colors and labels between frames.
+
+    Edges are drawn a single time as one static collection. Nodes are one
+    scatter collection and every label is one text artist, both marked as
+    animated, so a frame changes their colors and strings in place instead of
+    clearing the axes and drawing everything again. `render` blits: the
+    static background is rendered once and only the animated artists are
+    drawn on top of it for every frame.
+
+    Args:
+        graph (networkx.Graph): Graph to draw, its node order is the order of
+            the colors and labels given to `update`.
+        pos (dict): {node: (x, y)} positions.
+        ax (matplotlib.axes.Axes): Axes to draw on.
+        node_size (int): Marker size of the nodes.
+        font_size (int): Font size of the labels, labels are skipped if None.
+    """
+
+    def __init__(self, graph, pos, ax, node_size=500, font_size=8):
+        self.nodes = list(graph.nodes())
+        self.ax = ax
+        ax.axis("off")
+        xy = np.array([pos[node] for node in self.nodes]).reshape(-1, 2)
+
+        # Static part, drawn once
+        nx.draw_networkx_edges(graph, pos, ax=ax)
+
+        self.node_artist = ax.scatter(xy[:, 0], xy[:, 1], s=node_size,
+                                      zorder=2, animated=True)
+        self.labels = []
+        if font_size is not None:
+            self.labels = [ax.text(x, y, "", fontsize=font_size, ha="center",
+                                   va="center", zorder=3, animated=True)
+                           for x, y in xy]
+        # Inside the axes, so blitting restores it with the rest of the frame
+        self.title = ax.text(0.5, 1.0, "", transform=ax.transAxes, ha="center",
+                             va="bottom", fontsize=12, animated=True)
+        self.background = None
+
+    @property
+    def artists(self):
+        return [self.node_artist, self.title] + self.labels
+
+    def update(self, colors=None, labels=None, title=None):
+        """
+        Change node colors, labels and the title in place.
+
+        Args:
+            colors (list, optional): Color of every node, in graph order.
+            labels (list, optional): Label text of every node, in graph order.
+            title (str, optional): Title of the frame.
+
+        Returns:
+            list: The animated artists, for FuncAnimation with blit=True.
+        """
+        if colors is not None:
+            self.node_artist.set_facecolor(colors)
+        if labels is not None:
+            for text, label in zip(self.labels, labels):
+                text.set_text(label)
+        if title is not None:
+            self.title.set_text(title)
+        return self.artists
+
+    def render(self):
+        """
+        Blit the current frame and return it as an RGB image.
+        """
+        canvas = self.ax.figure.canvas
+        if self.background is None:
+            canvas.draw()  # Everything but the animated artists
+            self.background = canvas.copy_from_bbox(self.ax.figure.bbox)
+        canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.ax.draw_artist(artist)
+        return Image.fromarray(np.asarray(canvas.buffer_rgba())[..., :3])
+
+
+def save_gif(renderer, frames, output_file, fps=1):
+    """
+    Render every frame with the renderer and write them as a GIF.
+
+    Frames are reduced to 256-color images as they are rendered, so only
+    those are kept until the file is written.
+
+    Args:
+        renderer (GraphRenderer): Renderer whose artists the frames update.
+        frames (iterable): Advances the animation by one frame per item,
+            e.g. a generator that updates the renderer.
+        output_file (str): Path of the GIF.
+        fps (float): Frames per second.
+    """
+    images = []
+    for _ in frames:
+        images.append(renderer.render().quantize(colors=256))
+    images[0].save(output_file, save_all=True, append_images=images[1:],
+                   duration=round(1000 / fps), loop=0)
@@ -0,0 +1,165 @@
+"""
+Per-phase timers and counters for the simulation loop.
+
+The engine wraps each phase of an iteration in `metrics.phase(name)` and
+reports counters with `metrics.count(name, value)`. At the end of every
+iteration the collected values go to the hooks as one flat record:
+
+    {"iteration": 12, "play_seconds": 0.021, "edges_played": 217662, ...}
+
+A hook is any callable taking that record; hooks that also have a
+`close(totals)` method get the totals of the run at the end. Without
+metrics the engine uses NULL_METRICS, whose methods do nothing.
+
+    metrics = Metrics([JsonLinesHook("metrics.jsonl"),
+                       PrometheusTextHook("simulate.prom")])
+    simulate(graph, metrics=metrics)
+"""
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+class Metrics:
+    """
+    Collect phase times and counters and pass them to hooks once per iteration.
+
+    Args:
+        hooks (list): Callables receiving one record (dict) per iteration.
+    """
+
+    enabled = True  # Lets the engine skip computing counters for NULL_METRICS
+
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.current = defaultdict(int)
+        self.totals = defaultdict(int)
+        self.iterations = 0
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name + "_seconds"] += time.perf_counter() - started
+
+    def count(self, name, value=1):
+        self.current[name] += value
+
+    def end_iteration(self, iteration):
+        """
+        Send the values collected since the last call to the hooks.
+
+        Args:
+            iteration (int or None): Iteration the values belong to, None for
+                work outside the loop (e.g. writing the output).
+        """
+        record = {"iteration": iteration, **self.current}
+        for name, value in self.current.items():
+            self.totals[name] += value
+        if iteration is not None:
+            self.iterations += 1
+        self.current.clear()
+        for hook in self.hooks:
+            hook(record)
+
+    def close(self):
+        """
+        Give the totals of the run to the hooks that have a `close` method.
+        """
+        totals = {"iterations": self.iterations, **self.totals}
+        for hook in self.hooks:
+            if hasattr(hook, "close"):
+                hook.close(totals)
+        return totals
+
+
+class NullMetrics:
+    """
+    Metrics that record nothing, the default of the engine.
+    """
+
+    enabled = False
+    _phase = nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, value=1):
+        pass
+
+    def end_iteration(self, iteration):
+        pass
+
+    def close(self):
+        return {}
+
+
+NULL_METRICS = NullMetrics()
+
+
+class JsonLinesHook:
+    """
+    Append every record to a file as one JSON line, and the totals at the end.
+    """
+
+    def __init__(self, file_path):
+        self.file = open(file_path, "w")
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self, totals):
+        self.file.write(json.dumps({"totals": totals}) + "\n")
+        self.file.close()
+
+
+class PrometheusTextHook:
+    """
+    Keep the running totals in a file in the Prometheus text format, e.g. for
+    the textfile collector of node_exporter. The file is replaced atomically
+    every `every` records.
+
+    Args:
+        file_path (str): Output file, usually ending in .prom.
+        prefix (str): Prefix of every metric name.
+        every (int): Number of records between rewrites.
+    """
+
+    def __init__(self, file_path, prefix="simulate", every=1):
+        self.file_path = file_path
+        self.prefix = prefix
+        self.every = every
+        self.totals = defaultdict(int)
+        self.records = 0
+
+    def __call__(self, record):
+        for name, value in record.items():
+            if name != "iteration":
+                self.totals[name] += value
+        if record["iteration"] is not None:
+            self.totals["iterations"] += 1
+        self.records += 1
+        if self.records % self.every == 0:
+            self.write()
+
+    def close(self, totals):
+        self.write()
+
+    def write(self):
+        # Phase times are one metric with a label, so they are written together
+        phases, counters = [], []
+        for name, value in sorted(self.totals.items()):
+            if name.endswith("_seconds"):
+                phase = name[:-len("_seconds")]
+                phases.append(f'{self.prefix}_phase_seconds_total{{phase="{phase}"}} {value:.6f}')
+            else:
+                counters.append(f"{self.prefix}_{name}_total {value}")
+        lines = phases + counters
+        with open(self.file_path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(self.file_path + ".tmp", self.file_path)
@@ -0,0 +1,297 @@
+"""
+Bit-packed log of every move played on every link.
+
+Each undirected pair of nodes gets a pair id the first time it plays. The
+pair keeps that id when its link breaks and forms again, so its history has
+gaps instead of being split. Per turn, a pair has three bits:
+    played  the pair was linked and played
+    low     move of the lower node index (1 = "D")
+    high    move of the higher node index (1 = "D")
+
+The log is a directory of uncompressed .npz chunks, one per block of turns,
+like result_sink.ChunkedSink. In a chunk, each of the three arrays has shape
+(ceil(turns / 8), pairs): a byte row holds 8 turns of every pair, turn j is
+bit j % 8. The 100-turn run on the Facebook graph takes about 16 MB, half
+of it the pair index, where the notebook's string log was a CSV of one
+character per move.
+
+    log = InteractionLog("interactions")
+    log.open(num_nodes)
+    log.append(edges, actions)  # once per turn
+    log.close()
+
+InteractionLogReader memory-maps the chunks, so a query only reads the
+bytes of the pairs and turns it needs:
+
+    reader = InteractionLogReader("interactions")
+    reader.edge_history(u, v)        # (turns, 2) moves, NOT_PLAYED if unlinked
+    reader.cooperation_rate(u, 0, 50)
+    reader.mutual_defections(12)     # (K, 2) pairs that both defected
+"""
+import glob
+import json
+import os
+
+import numpy as np
+
+from graph_loader import memmap_npz
+from strategy_states import ACTIONS
+
+# Move of a pair in a turn it did not play
+NOT_PLAYED = -1
+BIT_ARRAYS = ["played", "low", "high"]
+
+
+def pair_keys(pairs, num_nodes):
+    """
+    One int64 key per (low, high) pair of node indices.
+    """
+    return pairs[:, 0].astype(np.int64) * num_nodes + pairs[:, 1]
+
+
+def write_npz(path, **arrays):
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+class InteractionLog:
+    """
+    Write the moves of every turn to a directory of bit-packed chunks.
+
+    Pair ids are looked up with a binary search in the sorted keys of the
+    known pairs, new pairs are inserted in place. On resume, chunks from
+    before `start` are kept and the ones after it are replaced.
+
+    Args:
+        directory (str): Output directory, created if needed.
+        chunk_size (int): Number of turns per chunk file, a multiple of 8.
+    """
+
+    def __init__(self, directory, chunk_size=64):
+        if chunk_size % 8:
+            raise ValueError("chunk_size must be a multiple of 8.")
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+    def open(self, num_nodes, start=0):
+        os.makedirs(self.directory, exist_ok=True)
+        for old_chunk in glob.glob(os.path.join(self.directory, "chunk_*.npz")):
+            if int(os.path.basename(old_chunk)[6:-4]) >= start:
+                os.remove(old_chunk)
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump({"num_nodes": num_nodes, "chunk_size": self.chunk_size}, f)
+
+        self.num_nodes = num_nodes
+        self.pairs = np.empty((0, 2), dtype=np.int32)
+        pairs_file = os.path.join(self.directory, "pairs.npz")
+        if start > 0 and os.path.exists(pairs_file):
+            with np.load(pairs_file) as data:
+                self.pairs = data["pairs"]
+        keys = pair_keys(self.pairs, num_nodes)
+        self.sorted_ids = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.sorted_ids]
+
+        self.num_turns = start
+        self.bytes_written = 0
+        self.bits = {name: np.zeros((self.chunk_size // 8, max(len(self.pairs), 1024)),
+                                    dtype=np.uint8) for name in BIT_ARRAYS}
+        self.filled = 0
+
+    def pair_ids(self, pairs):
+        """
+        Ids of (low, high) pairs, registering the ones not seen before.
+        """
+        keys = pair_keys(pairs, self.num_nodes)
+        position = np.searchsorted(self.sorted_keys, keys)
+        known = position < len(self.sorted_keys)
+        known[known] = self.sorted_keys[position[known]] == keys[known]
+        ids = np.empty(len(keys), dtype=np.int64)
+        ids[known] = self.sorted_ids[position[known]]
+        if known.all():
+            return ids
+
+        new_keys, first, inverse = np.unique(keys[~known], return_index=True,
+                                             return_inverse=True)
+        new_ids = np.arange(len(self.pairs), len(self.pairs) + len(new_keys))
+        ids[~known] = new_ids[inverse]
+        insert_at = np.searchsorted(self.sorted_keys, new_keys)
+        self.sorted_keys = np.insert(self.sorted_keys, insert_at, new_keys)
+        self.sorted_ids = np.insert(self.sorted_ids, insert_at, new_ids)
+        self.pairs = np.concatenate([self.pairs, pairs[~known][first].astype(np.int32)])
+        capacity = self.bits["played"].shape[1]
+        if len(self.pairs) > capacity:
+            grow = max(capacity, len(self.pairs) - capacity)
+            for name, bits in self.bits.items():
+                self.bits[name] = np.pad(bits, ((0, 0), (0, grow)))
+        return ids
+
+    def append(self, edges, actions):
+        """
+        Log one turn.
+
+        Args:
+            edges (numpy.ndarray): (E, 2) node indices of the linked pairs.
+            actions (numpy.ndarray): (E, 2) moves of both endpoints, 1 = "D".
+        """
+        swap = edges[:, 0] > edges[:, 1]
+        pairs = np.where(swap[:, None], edges[:, ::-1], edges)
+        moves = np.where(swap[:, None], actions[:, ::-1], actions).astype(bool)
+        ids = self.pair_ids(pairs)
+
+        row, bit = divmod(self.filled, 8)
+        self.bits["played"][row, ids] |= np.uint8(1 << bit)
+        self.bits["low"][row, ids[moves[:, 0]]] |= np.uint8(1 << bit)
+        self.bits["high"][row, ids[moves[:, 1]]] |= np.uint8(1 << bit)
+        self.filled += 1
+        self.num_turns += 1
+        if self.filled == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.filled:
+            return
+        first_turn = self.num_turns - self.filled
+        rows = (self.filled + 7) // 8
+        path = os.path.join(self.directory, f"chunk_{first_turn:08d}.npz")
+        write_npz(path, turns=np.array([self.filled]),
+                  **{name: bits[:rows, :len(self.pairs)] for name, bits in self.bits.items()})
+        self.bytes_written += os.path.getsize(path)
+
+        # Pairs sorted by (low, high) and by (high, low) for the node queries
+        pairs_file = os.path.join(self.directory, "pairs.npz")
+        high_keys = pair_keys(self.pairs[:, ::-1], self.num_nodes)
+        by_high = np.argsort(high_keys, kind="stable")
+        write_npz(pairs_file, pairs=self.pairs,
+                  low_keys=self.sorted_keys, by_low=self.sorted_ids.astype(np.int32),
+                  high_keys=high_keys[by_high], by_high=by_high.astype(np.int32))
+        self.bytes_written += os.path.getsize(pairs_file)
+
+        for bits in self.bits.values():
+            bits[:] = 0
+        self.filled = 0
+
+    def close(self):
+        self.flush()
+
+
+class InteractionLogReader:
+    """
+    Memory-mapped queries on a log written by InteractionLog.
+
+    Turns are numbered from the start of the run, ranges are start..stop-1.
+
+    Args:
+        directory (str): Directory written by InteractionLog.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.num_nodes = json.load(f)["num_nodes"]
+        arrays = memmap_npz(os.path.join(directory, "pairs.npz"))
+        self.pairs = arrays["pairs"]
+        self.low_keys, self.by_low = arrays["low_keys"], arrays["by_low"]
+        self.high_keys, self.by_high = arrays["high_keys"], arrays["by_high"]
+
+        self.chunks = []  # [(first turn, number of turns, {name: memmap})]
+        for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+            arrays = memmap_npz(path)
+            self.chunks.append((int(os.path.basename(path)[6:-4]), int(arrays["turns"][0]), arrays))
+        self.num_turns = self.chunks[-1][0] + self.chunks[-1][1] if self.chunks else 0
+
+    def pair_id(self, u, v):
+        """
+        Id of the pair (u, v), None if it never played.
+        """
+        key = min(u, v) * self.num_nodes + max(u, v)
+        position = np.searchsorted(self.low_keys, key)
+        if position < len(self.low_keys) and self.low_keys[position] == key:
+            return int(self.by_low[position])
+        return None
+
+    def node_pairs(self, node):
+        """
+        Ids of the pairs where the node is the lower and the higher index.
+        """
+        bounds = [node * self.num_nodes, (node + 1) * self.num_nodes]
+        low = np.searchsorted(self.low_keys, bounds)
+        high = np.searchsorted(self.high_keys, bounds)
+        return np.asarray(self.by_low[low[0]:low[1]]), np.asarray(self.by_high[high[0]:high[1]])
+
+    def bits(self, name, ids, start=0, stop=None):
+        """
+        Bits of the pairs `ids` as a (turns, len(ids)) bool array.
+        """
+        stop = self.num_turns if stop is None else min(stop, self.num_turns)
+        parts = []
+        for first_turn, turns, arrays in self.chunks:
+            lo, hi = max(start, first_turn) - first_turn, min(stop, first_turn + turns) - first_turn
+            if lo >= hi:
+                continue
+            packed = arrays[name]
+            # Pairs that first played after this chunk have no column in it
+            present = ids < packed.shape[1]
+            rows = np.zeros((hi - lo, len(ids)), dtype=bool)
+            if present.any():
+                block = np.asarray(packed[lo // 8:(hi + 7) // 8][:, ids[present]])
+                unpacked = np.unpackbits(block, axis=0, bitorder="little").astype(bool)
+                rows[:, present] = unpacked[lo % 8:lo % 8 + hi - lo]
+            parts.append(rows)
+        if not parts:
+            return np.zeros((0, len(ids)), dtype=bool)
+        return np.concatenate(parts)
+
+    def edge_history(self, u, v, start=0, stop=None):
+        """
+        Moves of the pair (u, v) in every turn.
+
+        Returns:
+            numpy.ndarray: int8 array of shape (turns, 2), column 0 are the
+            moves of u and column 1 those of v (0 = "C", 1 = "D"), NOT_PLAYED
+            in turns where they were not linked.
+        """
+        pair = self.pair_id(u, v)
+        if pair is None:
+            stop = self.num_turns if stop is None else min(stop, self.num_turns)
+            return np.full((max(stop - start, 0), 2), NOT_PLAYED, dtype=np.int8)
+        ids = np.array([pair])
+        moves = np.stack([self.bits("low", ids, start, stop)[:, 0],
+                          self.bits("high", ids, start, stop)[:, 0]], axis=1).astype(np.int8)
+        moves[~self.bits("played", ids, start, stop)[:, 0]] = NOT_PLAYED
+        return moves if u <= v else moves[:, ::-1]
+
+    def edge_history_string(self, u, v, start=0, stop=None):
+        """
+        Moves of u against v as a string like the notebook's log ("CCDC..."),
+        turns where they were not linked are skipped.
+        """
+        moves = self.edge_history(u, v, start, stop)[:, 0]
+        return "".join(ACTIONS[move] for move in moves[moves != NOT_PLAYED])
+
+    def cooperation_rate(self, node, start=0, stop=None):
+        """
+        Share of the moves of a node in turns start..stop-1 that were "C",
+        NaN if it did not play.
+        """
+        as_low, as_high = self.node_pairs(node)
+        moves = defections = 0
+        for name, ids in (("low", as_low), ("high", as_high)):
+            played = self.bits("played", ids, start, stop)
+            moves += np.count_nonzero(played)
+            defections += np.count_nonzero(played & self.bits(name, ids, start, stop))
+        return 1 - defections / moves if moves else float("nan")
+
+    def mutual_defections(self, turn):
+        """
+        Pairs that both defected in a turn.
+
+        Returns:
+            numpy.ndarray: (K, 2) node indices, lower index first.
+        """
+        for first_turn, turns, arrays in self.chunks:
+            if first_turn <= turn < first_turn + turns:
+                row, bit = divmod(turn - first_turn, 8)
+                both = arrays["played"][row] & arrays["low"][row] & arrays["high"][row]
+                ids = np.flatnonzero(both & np.uint8(1 << bit))
+                return np.asarray(self.pairs[ids])
+        return np.empty((0, 2), dtype=np.int32)
@@ -0,0 +1,78 @@
+import axelrod as axl
+
+from match_cycles import cycle_scores
+
+
+class MatchCache:
+    """
+    Memoize the scores of matches between deterministic strategies.
+
+    Results are keyed on (strategy_u, strategy_v, turns, game), so each
+    deterministic pairing is played once, and only until its state repeats
+    when both strategies have a known state (see match_cycles). Pairings with
+    a stochastic strategy (e.g. Random, ZDExtort2) are played every time.
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.stochastic = {}  # {strategy class: is stochastic}
+        self.hits = 0
+        self.misses = 0
+
+    def is_stochastic(self, strategy):
+        if strategy not in self.stochastic:
+            self.stochastic[strategy] = axl.Classifiers["stochastic"](strategy())
+        return self.stochastic[strategy]
+
+    def scores(self, strategy_u, strategy_v, turns, game, seed=None):
+        """
+        Total scores of both players of a match.
+
+        Args:
+            strategy_u (type): Strategy class of the first player.
+            strategy_v (type): Strategy class of the second player.
+            turns (int): Number of turns of the match.
+            game (axelrod.Game): The game scoring.
+            seed (int, optional): Seed of the match, only used when it is played.
+
+        Returns:
+            tuple: (score_u, score_v)
+        """
+        if self.is_stochastic(strategy_u) or self.is_stochastic(strategy_v):
+            self.misses += 1
+            return play_match(strategy_u, strategy_v, turns, game, seed)
+
+        key = (strategy_u, strategy_v, turns, game.RPST())
+        if key in self.results:
+            self.hits += 1
+            return self.results[key]
+
+        self.misses += 1
+        scores = cycle_scores(strategy_u, strategy_v, turns, game)
+        if scores is None:
+            scores = play_match(strategy_u, strategy_v, turns, game)
+        scores_u, scores_v = scores
+        self.results[key] = (scores_u, scores_v)
+        # The same pairing seen from the other player
+        self.results[(strategy_v, strategy_u, turns, game.RPST())] = (scores_v, scores_u)
+        return scores_u, scores_v
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def play_match(strategy_u, strategy_v, turns, game, seed=None):
+    """
+    Play one match and return the total scores of both players.
+    """
+    match = axl.Match([strategy_u(), strategy_v()], turns=turns, game=game, seed=seed)
+    actions = match.play()
+
+    # Compute numerical scores for the match
+    scores_u, scores_v = 0, 0
+    for action_u, action_v in actions:
+        score_u, score_v = game.score((action_u, action_v))
+        scores_u += score_u
+        scores_v += score_v
+    return scores_u, scores_v
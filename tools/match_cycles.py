@@ -0,0 +1,189 @@
+"""
+Scores of long matches between deterministic strategies in closed form.
+
+A deterministic match only depends on the joint state of its two players.
+Once that state repeats, the turns since its first visit repeat forever, so
+the scores of any number of turns follow from the turns before the cycle and
+the scores of one cycle. TitForTat against CyclerCCD cycles after 3 turns,
+so 10^5 turns cost as much as 5.
+
+The state of a player is what its next move depends on:
+- STATE_SUMMARIES, written by hand for deterministic strategies that axelrod
+  classifies with an infinite memory but that only look at a small summary
+  (like strategy_states does for the notebook strategies), and for Cyclers;
+- otherwise, for a finite axelrod memory depth m, the last m moves of both
+  players (fewer in the first turns) together with a snapshot of the
+  player's own attributes, since some strategies keep counters or a finite
+  state machine next to their declared memory (e.g. ForgetfulGrudger,
+  SecondByColbert).
+Stochastic strategies, strategies that look at the match length and
+strategies with an unbounded memory have no state: their matches are played
+turn by turn. Against playing every turn, all pairs of the deterministic
+short run time strategies of axelrod give the same scores.
+"""
+from functools import lru_cache
+
+import axelrod as axl
+import numpy as np
+
+# Attributes of every player that do not change during a match, or that the
+# state already covers (the history)
+PLAYER_ATTRIBUTES = {"_history", "classifier", "init_kwargs", "match_attributes"}
+
+
+def last_moves(depth):
+    """
+    State of a strategy that looks at the last `depth` moves of both players.
+    """
+    def state(player, opponent):
+        if depth == 0:
+            return ()
+        return tuple(player.history[-depth:]), tuple(opponent.history[-depth:])
+    return state
+
+
+STATE_SUMMARIES = {
+    # Defects for good once the opponent defected
+    axl.Grudger: lambda player, opponent: opponent.defections > 0,
+    # Flips its last move after an opponent's defection, starts with C
+    axl.Appeaser: last_moves(1),
+    # Position in its cycle
+    axl.Cycler: lambda player, opponent: len(player.history) % len(player.cycle),
+}
+
+
+def snapshot(value):
+    """
+    Hashable copy of an attribute value, TypeError for values it cannot copy.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, axl.Action)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(snapshot(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((repr(key), snapshot(item)) for key, item in value.items()))
+    if isinstance(value, np.ndarray):
+        return value.shape, value.tobytes()
+    if hasattr(value, "__dict__"):  # e.g. the finite state machine of a player
+        return type(value).__name__, snapshot(vars(value))
+    raise TypeError(f"Cannot snapshot {type(value).__name__}")
+
+
+def player_attributes(player):
+    return snapshot({name: value for name, value in vars(player).items()
+                     if name not in PLAYER_ATTRIBUTES})
+
+
+def memory_state(depth):
+    """
+    State of a strategy with a finite memory depth, see module docstring.
+    """
+    moves = last_moves(depth)
+
+    def state(player, opponent):
+        return moves(player, opponent), player_attributes(player)
+    return state
+
+
+def summary_function(strategy):
+    for cls in strategy.__mro__:
+        # Subclasses only share the summary if they keep the strategy
+        if cls in STATE_SUMMARIES and strategy.strategy is cls.strategy:
+            return STATE_SUMMARIES[cls]
+    return None
+
+
+@lru_cache(maxsize=None)
+def state_function(strategy):
+    """
+    Function (player, opponent) -> hashable state of a strategy, None if the
+    strategy has no finite state (see module docstring).
+    """
+    summary = summary_function(strategy)
+    if summary is not None:
+        return summary
+    player = strategy()
+    if axl.Classifiers["stochastic"](player) or \
+            "length" in axl.Classifiers["makes_use_of"](player):
+        return None
+    depth = axl.Classifiers["memory_depth"](player)
+    if depth == float("inf"):
+        return None
+    try:
+        player_attributes(player)
+    except TypeError:
+        return None
+    return memory_state(int(depth))
+
+
+class CycleFinder:
+    """
+    Record the joint states of a match turn by turn until one repeats.
+
+    Call `observe` before every turn and `record` after it. Once `observe`
+    returns the cycle, turn t >= start scores `scores[start + (t - start) % period]`.
+
+    Args:
+        strategy_u (type): Strategy class of the first player.
+        strategy_v (type): Strategy class of the second player.
+    """
+
+    def __init__(self, strategy_u, strategy_v):
+        self.states = (state_function(strategy_u), state_function(strategy_v))
+        self.enabled = None not in self.states
+        self.seen = {}  # {joint state: number of turns played when it was seen}
+        self.scores = []  # Scores of every turn played so far
+
+    def observe(self, player_u, player_v):
+        """
+        Returns:
+            tuple or None: (start, period) of the cycle once the state repeats.
+        """
+        state_u, state_v = self.states
+        state = (state_u(player_u, player_v), state_v(player_v, player_u))
+        turn = len(self.scores)
+        if state in self.seen:
+            start = self.seen[state]
+            return start, turn - start
+        self.seen[state] = turn
+        return None
+
+    def record(self, scores):
+        self.scores.append(scores)
+
+
+def cycle_scores(strategy_u, strategy_v, turns, game):
+    """
+    Total scores of both players of a match, played until its state repeats.
+
+    Args:
+        strategy_u (type): Strategy class of the first player.
+        strategy_v (type): Strategy class of the second player.
+        turns (int): Number of turns of the match.
+        game (axelrod.Game): The game scoring.
+
+    Returns:
+        tuple or None: (score_u, score_v), None if one of the strategies has
+        no finite state and the match has to be played.
+    """
+    finder = CycleFinder(strategy_u, strategy_v)
+    if not finder.enabled:
+        return None
+    match = axl.Match([strategy_u(), strategy_v()], turns=turns, game=game)
+    for player in match.players:
+        player.set_match_attributes(**match.match_attributes)
+
+    totals = [(0, 0)]  # Scores after every number of turns
+    for turn in range(turns):
+        cycle = finder.observe(*match.players)
+        if cycle is not None:
+            start, period = cycle
+            repeats, rest = divmod(turns - turn, period)
+            return tuple(
+                totals[turn][i] + repeats * (totals[turn][i] - totals[start][i]) +
+                totals[start + rest][i] - totals[start][i]
+                for i in range(2))
+        scores = game.score(match.simultaneous_play(*match.players))
+        finder.record(scores)
+        totals.append((totals[-1][0] + scores[0], totals[-1][1] + scores[1]))
+    return totals[-1]
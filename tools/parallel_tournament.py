@@ -0,0 +1,227 @@
+"""
+Spatial tournament (one match per edge) played on all cores.
+
+The edge list is cut into balanced shards that run in a process pool. A
+worker only receives its slice of edges, the strategy code of every node and
+the seeds of its matches, never a networkx graph. Every edge has its own
+seed, so results do not depend on the number of workers or shards. Shards
+can be recorded in a tournament_results.TournamentResults as they finish.
+
+play_edge_file plays graphs larger than the memory out of core: it reads
+the binary edge list of graph_loader.convert_edges chunk by chunk from a
+memory map, and only keeps the strategy code and total score of every node,
+so the memory is bounded by the number of nodes plus one chunk per worker,
+not by the number of edges.
+"""
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import axelrod as axl
+import numpy as np
+
+from match_cache import MatchCache
+
+# Strategies of the nodes in the workers of play_edge_file, set once per process
+worker_strategies = {}
+
+
+def pool_context():
+    """
+    Fork workers on Linux so they do not import axelrod again (slow);
+    elsewhere keep the platform default.
+    """
+    if sys.platform.startswith("linux"):
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def play_shard(edges, strategy_codes, strategies, turns, seeds):
+    """
+    Play the matches of one shard of edges.
+
+    Args:
+        edges (numpy.ndarray): (E, 2) array of node indices.
+        strategy_codes (numpy.ndarray): Index into `strategies` for every node.
+        strategies (list): Strategy classes.
+        turns (int): Number of turns of every match.
+        seeds (numpy.ndarray): Seed of the match on every edge.
+
+    Returns:
+        tuple: (edge_scores, node_scores, cache hits, cache misses) where
+        edge_scores is (E, 2) and node_scores holds the shard's total per node.
+    """
+    game = axl.Game()  # Define the game scoring
+    cache = MatchCache()
+    edge_scores = np.empty((len(edges), 2), dtype=np.int64)
+    for i, (u, v) in enumerate(edges.tolist()):
+        edge_scores[i] = cache.scores(strategies[strategy_codes[u]],
+                                      strategies[strategy_codes[v]],
+                                      turns, game, int(seeds[i]))
+    node_scores = np.bincount(edges.ravel(), weights=edge_scores.ravel(),
+                              minlength=len(strategy_codes)).astype(np.int64)
+    return edge_scores, node_scores, cache.hits, cache.misses
+
+
+def shard_bounds(num_edges, num_shards):
+    """
+    Split range(num_edges) into num_shards contiguous, balanced (start, stop) slices.
+    """
+    bounds = np.linspace(0, num_edges, num_shards + 1).round().astype(int)
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def play_tournament(edges, strategy_codes, strategies, turns=100, workers=None,
+                    seed=None, shards_per_worker=4, results=None):
+    """
+    Play one match on every edge using a pool of processes.
+
+    Args:
+        edges (numpy.ndarray): (E, 2) array of node indices.
+        strategy_codes (numpy.ndarray): Index into `strategies` for every node.
+        strategies (list): Strategy classes, e.g. [axl.Cooperator, axl.Defector].
+        turns (int): Number of turns of every match.
+        workers (int, optional): Number of processes, all cores by default. 1 plays in this process.
+        seed (int, optional): Seed for the stochastic matches.
+        shards_per_worker (int): More shards than workers evens out slow shards.
+        results (TournamentResults, optional): Records the matches of every
+            shard as soon as it finishes.
+
+    Returns:
+        dict: 'node_scores' (N,), 'edge_scores' (E, 2), 'seconds',
+        'edges_per_second', 'workers' and the match cache 'hit_rate'.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    strategy_codes = np.asarray(strategy_codes, dtype=np.int64)
+    workers = workers or os.cpu_count()
+    seeds = np.random.default_rng(seed).integers(2 ** 31, size=len(edges))
+    bounds = shard_bounds(len(edges), workers * shards_per_worker)
+    jobs = [(edges[start:stop], strategy_codes, strategies, turns, seeds[start:stop])
+            for start, stop in bounds]
+
+    edge_scores = np.empty((len(edges), 2), dtype=np.int64)
+    node_scores = np.zeros(len(strategy_codes), dtype=np.int64)
+    hits = misses = 0
+
+    def collect(shards):
+        nonlocal hits, misses
+        for (start, stop), (shard_edges, shard_nodes, shard_hits, shard_misses) in zip(bounds, shards):
+            edge_scores[start:stop] = shard_edges
+            node_scores[:] += shard_nodes
+            hits += shard_hits
+            misses += shard_misses
+            if results is not None:
+                results.record(edges[start:stop], shard_edges)
+
+    started = time.perf_counter()
+    if workers == 1:
+        collect(play_shard(*job) for job in jobs)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+            # map yields the shards in order while the later ones are still playing
+            collect(pool.map(play_shard, *zip(*jobs)))
+    seconds = time.perf_counter() - started
+
+    return {
+        "node_scores": node_scores,
+        "edge_scores": edge_scores,
+        "seconds": seconds,
+        "edges_per_second": len(edges) / seconds if seconds else float("inf"),
+        "workers": workers,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+def init_edge_worker(strategy_codes, strategies):
+    worker_strategies["codes"] = strategy_codes
+    worker_strategies["classes"] = strategies
+
+
+def play_edge_chunk(edge_path, start, stop, turns, seeds):
+    """
+    Play edges start..stop-1 of a binary edge list (see play_edge_file).
+
+    Returns:
+        tuple: (node_scores, edges played, cache hits, cache misses)
+    """
+    edges = np.asarray(np.load(edge_path, mmap_mode="r")[start:stop], dtype=np.int64)
+    # Self loops are not edges of load_graph either
+    keep = edges[:, 0] != edges[:, 1]
+    _, node_scores, hits, misses = play_shard(edges[keep], worker_strategies["codes"],
+                                              worker_strategies["classes"], turns, seeds[keep])
+    return node_scores, int(np.count_nonzero(keep)), hits, misses
+
+
+def play_edge_file(edge_path, strategy_codes, strategies, turns=100, workers=None,
+                   seed=None, chunk_edges=1 << 20):
+    """
+    Play one match on every edge of a memory-mapped binary edge list.
+
+    Edges get the same seeds as in play_tournament with the edges in file
+    order, so both give the same scores.
+
+    Args:
+        edge_path (str): (E, 2) .npy edge list, e.g. graph_loader.edge_file_path(file_path).
+        strategy_codes (numpy.ndarray): Index into `strategies` for every node.
+        strategies (list): Strategy classes, e.g. [axl.Cooperator, axl.Defector].
+        turns (int): Number of turns of every match.
+        workers (int, optional): Number of processes, all cores by default. 1 plays in this process.
+        seed (int, optional): Seed for the stochastic matches.
+        chunk_edges (int): Number of edges read and played at once.
+
+    Returns:
+        dict: 'node_scores' (N,), 'num_edges' (matches played, self loops
+        of the file left out), 'seconds', 'edges_per_second', 'workers'
+        and the match cache 'hit_rate'.
+    """
+    strategy_codes = np.asarray(strategy_codes, dtype=np.min_scalar_type(len(strategies)))
+    file_edges = len(np.load(edge_path, mmap_mode="r"))
+    workers = workers or os.cpu_count()
+    rng = np.random.default_rng(seed)
+    node_scores = np.zeros(len(strategy_codes), dtype=np.int64)
+    num_edges = hits = misses = 0
+
+    def jobs():
+        for start in range(0, file_edges, chunk_edges):
+            stop = min(start + chunk_edges, file_edges)
+            # Drawn chunk by chunk, these are the seeds play_tournament draws at once
+            yield edge_path, start, stop, turns, rng.integers(2 ** 31, size=stop - start)
+
+    def collect(result):
+        nonlocal num_edges, hits, misses
+        chunk_scores, chunk_edges_played, chunk_hits, chunk_misses = result
+        node_scores[:] += chunk_scores
+        num_edges += chunk_edges_played
+        hits += chunk_hits
+        misses += chunk_misses
+
+    started = time.perf_counter()
+    if workers == 1:
+        init_edge_worker(strategy_codes, strategies)
+        for job in jobs():
+            collect(play_edge_chunk(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                                 initializer=init_edge_worker,
+                                 initargs=(strategy_codes, strategies)) as pool:
+            # A few chunks in flight per worker, never the whole edge list
+            pending = deque()
+            for job in jobs():
+                if len(pending) == 2 * workers:
+                    collect(pending.popleft().result())
+                pending.append(pool.submit(play_edge_chunk, *job))
+            while pending:
+                collect(pending.popleft().result())
+    seconds = time.perf_counter() - started
+
+    return {
+        "node_scores": node_scores,
+        "num_edges": num_edges,
+        "seconds": seconds,
+        "edges_per_second": num_edges / seconds if seconds else float("inf"),
+        "workers": workers,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
@@ -1,8 +1,10 @@
 import os
 from matplotlib import pyplot as plt
-from scipy.io import mmread
 import networkx as nx
 
+from graph_loader import load_graph
+from layouts import file_layout
+
 # Set the file path (ensure the path is correct)
 file_path = './fb_graph/matname.mtx'
 
@@ -10,11 +12,8 @@ file_path = './fb_graph/matname.mtx'
 if not os.path.exists(file_path):
     raise FileNotFoundError(f"The file {file_path} does not exist!")
 
-# Read the Matrix Market file as a sparse matrix
-sparse_matrix = mmread(file_path)
-
-# Convert the sparse matrix into a NetworkX graph
-graph = nx.Graph(sparse_matrix)
+# Load the graph from the Matrix Market file (through its CSR cache)
+graph = load_graph(file_path)
 
 # Print basic graph information
 print(f"Number of nodes: {graph.number_of_nodes()}")
@@ -23,8 +22,8 @@ print(f"Number of edges: {graph.number_of_edges()}")
 # Plotting the graph
 plt.figure(figsize=(8, 6))
 
-# Generate layout for nodes
-pos = nx.spring_layout(graph, iterations=50)
+# Layout for nodes, computed once per graph file and shared with the other tools
+pos = dict(enumerate(file_layout(file_path)))
 
 # Draw the graph
 nx.draw(graph, pos,
@@ -0,0 +1,287 @@
+"""
+Result sinks for the per-iteration strategy and average payoff of every node.
+
+A sink gets one column (the values of all nodes) per iteration while the
+simulation runs:
+
+    sink.open(nodes, strategy_names, start)
+    sink.append(strategy, payoff)  # once per iteration
+    sink.flush()  # before every checkpoint
+    sink.close()
+
+`start` is the first iteration to record, it is not 0 when a run is resumed
+from a checkpoint. `bytes_written` counts the bytes a sink has written so far.
+
+CsvSink writes the wide CSV files of the notebook (one row per node), so it
+has to keep the whole run in memory. ChunkedSink streams uint8 strategy codes
+and float32 payoffs to uncompressed .npz chunks, so memory stays flat, and
+HistoryReader memory-maps them back by node and iteration range. NullSink
+writes nothing, for runs that only keep aggregates (see strategy_series).
+"""
+import csv
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+
+from graph_loader import memmap_npz
+
+
+def write_history(file_name, first_column, nodes, history, start=0):
+    """
+    Write a (iterations, nodes) history as one row per node.
+    """
+    with open(file_name, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([first_column] +
+                        [str(i) for i in range(start, start + len(history))])
+        for index, node in enumerate(nodes):
+            writer.writerow([node] + list(history[:, index]))
+
+
+class CsvSink:
+    """
+    Collect the run in memory and write the notebook's CSV files on close.
+
+    Every flush (simulate flushes before each checkpoint) also saves the
+    iterations since the last flush as a chunk in `<strategy_csv>.partial/`,
+    like ChunkedSink, so a flush costs the new iterations only. A resumed run
+    reloads the iterations before its checkpoint from the chunks, so the CSV
+    files of a resumed run cover the whole run. The directory is removed on
+    close.
+
+    Args:
+        strategy_csv (str): Output file for the strategy at the start of each iteration.
+        payoff_csv (str): Output file for the average payoff at the end of each iteration.
+    """
+
+    def __init__(self, strategy_csv, payoff_csv):
+        self.strategy_csv = strategy_csv
+        self.payoff_csv = payoff_csv
+        self.partial_dir = strategy_csv + ".partial"
+
+    def _chunks(self):
+        # [(first iteration, path)] of the saved chunks, in order
+        paths = glob.glob(os.path.join(self.partial_dir, "chunk_*.npz"))
+        return sorted((int(os.path.basename(path)[6:-4]), path) for path in paths)
+
+    def _load_partial(self, start):
+        """
+        The first `start` iterations saved by the flushes of the interrupted
+        run, or None when some of them are missing. Chunks after `start` are
+        removed, they are played again.
+        """
+        strategy, payoff = [], []
+        saved = 0
+        for first_iteration, path in self._chunks():
+            if first_iteration >= start:
+                os.remove(path)
+            elif first_iteration == saved:
+                with np.load(path) as data:
+                    strategy.append(data["strategy"])
+                    payoff.append(data["payoff"])
+                saved += len(strategy[-1])
+        if saved < start:
+            return None
+        strategy, payoff = np.concatenate(strategy)[:start], np.concatenate(payoff)[:start]
+        if saved > start:
+            # The last chunk goes past the checkpoint, keep only its start
+            shutil.rmtree(self.partial_dir)
+            self._save_chunk(0, strategy, payoff)
+        return strategy, payoff
+
+    def _save_chunk(self, first_iteration, strategy, payoff):
+        os.makedirs(self.partial_dir, exist_ok=True)
+        path = os.path.join(self.partial_dir, f"chunk_{first_iteration:08d}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, strategy=strategy, payoff=payoff)
+        os.replace(path + ".tmp", path)
+        return os.path.getsize(path)
+
+    def open(self, nodes, strategy_names, start=0):
+        self.nodes = list(nodes)
+        self.strategy_names = np.array(strategy_names)
+        self.start = 0
+        self.bytes_written = 0
+        self.strategy_history = []
+        self.payoff_history = []
+        partial = self._load_partial(start) if start > 0 else None
+        if partial is not None:
+            # Iterations after the checkpoint are played again
+            self.strategy_history = list(partial[0])
+            self.payoff_history = list(partial[1])
+        else:
+            if start > 0:
+                print(f"No {self.partial_dir}, the CSV files start at iteration {start}")
+                self.start = start
+            if os.path.exists(self.partial_dir):
+                shutil.rmtree(self.partial_dir)
+        self.saved = len(self.strategy_history)  # Iterations already in chunks
+
+    def append(self, strategy, payoff):
+        self.strategy_history.append(np.array(strategy, dtype=np.uint8))
+        self.payoff_history.append(np.round(payoff, 3))
+
+    def history(self, start=0):
+        """
+        (iterations, nodes) strategy codes and payoffs recorded so far, from
+        the `start`-th recorded iteration on.
+        """
+        strategy_history = np.array(self.strategy_history[start:],
+                                    dtype=np.uint8).reshape(-1, len(self.nodes))
+        payoff_history = np.array(self.payoff_history[start:],
+                                  dtype=float).reshape(-1, len(self.nodes))
+        return strategy_history, payoff_history
+
+    def flush(self):
+        if self.start > 0 or self.saved == len(self.strategy_history):
+            return  # Without the start of the run there is nothing to resume from
+        self.bytes_written += self._save_chunk(self.saved, *self.history(self.saved))
+        self.saved = len(self.strategy_history)
+
+    def close(self):
+        print("Saving to csv file...")
+        strategy_history, payoff_history = self.history()
+        write_history(self.strategy_csv, "Node", self.nodes,
+                      self.strategy_names[strategy_history], self.start)
+        write_history(self.payoff_csv, "Player", self.nodes, payoff_history,
+                      self.start)
+        self.bytes_written += (os.path.getsize(self.strategy_csv) +
+                               os.path.getsize(self.payoff_csv))
+        if os.path.exists(self.partial_dir):
+            shutil.rmtree(self.partial_dir)
+
+
+class ChunkedSink:
+    """
+    Stream the run to a directory of .npz chunks of `chunk_size` iterations.
+
+    Each chunk holds 'strategy' (uint8 codes) and 'payoff' (float32) arrays
+    of shape (iterations, nodes). Node labels go to nodes.npy and the
+    strategy names to meta.json. On resume, chunks from before `start` are
+    kept and the ones after it are replaced.
+
+    Args:
+        directory (str): Output directory, created if needed.
+        chunk_size (int): Number of iterations per chunk file.
+    """
+
+    def __init__(self, directory, chunk_size=64):
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+    def open(self, nodes, strategy_names, start=0):
+        os.makedirs(self.directory, exist_ok=True)
+        for old_chunk in glob.glob(os.path.join(self.directory, "chunk_*.npz")):
+            first_iteration = int(os.path.basename(old_chunk)[6:-4])
+            if first_iteration >= start:
+                os.remove(old_chunk)
+        np.save(os.path.join(self.directory, "nodes.npy"), np.asarray(list(nodes)))
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump({"strategies": list(strategy_names),
+                       "chunk_size": self.chunk_size}, f)
+
+        self.num_nodes = len(nodes)
+        self.num_iterations = start
+        self.bytes_written = 0
+        self.strategy = np.empty((self.chunk_size, self.num_nodes), dtype=np.uint8)
+        self.payoff = np.empty((self.chunk_size, self.num_nodes), dtype=np.float32)
+        self.filled = 0
+
+    def append(self, strategy, payoff):
+        self.strategy[self.filled] = strategy
+        self.payoff[self.filled] = payoff
+        self.filled += 1
+        self.num_iterations += 1
+        if self.filled == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.filled:
+            return
+        first_iteration = self.num_iterations - self.filled
+        path = os.path.join(self.directory, f"chunk_{first_iteration:08d}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, strategy=self.strategy[:self.filled],
+                     payoff=self.payoff[:self.filled])
+        os.replace(path + ".tmp", path)
+        self.bytes_written += os.path.getsize(path)
+        self.filled = 0
+
+    def close(self):
+        self.flush()
+
+
+class NullSink:
+    """
+    Keep no per-node history.
+    """
+
+    bytes_written = 0
+
+    def open(self, nodes, strategy_names, start=0):
+        pass
+
+    def append(self, strategy, payoff):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class HistoryReader:
+    """
+    Memory-mapped access to a run written by ChunkedSink.
+
+    Args:
+        directory (str): Directory written by ChunkedSink.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.strategy_names = meta["strategies"]
+        self.nodes = np.load(os.path.join(directory, "nodes.npy"), allow_pickle=True)
+
+        self.chunks = []  # [(first iteration, {name: memmap})]
+        first_iteration = 0
+        for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+            arrays = memmap_npz(path)
+            self.chunks.append((first_iteration, arrays))
+            first_iteration += len(arrays["strategy"])
+        self.num_iterations = first_iteration
+
+    def _read(self, name, nodes, start, stop):
+        stop = self.num_iterations if stop is None else min(stop, self.num_iterations)
+        nodes = slice(None) if nodes is None else nodes
+        parts = []
+        for first_iteration, arrays in self.chunks:
+            rows = arrays[name]
+            lo, hi = max(start, first_iteration), min(stop, first_iteration + len(rows))
+            if lo < hi:
+                parts.append(rows[lo - first_iteration:hi - first_iteration][:, nodes])
+        if not parts:
+            return np.empty((0, len(self.nodes)), dtype=np.float32)[:, nodes]
+        return np.concatenate(parts)
+
+    def strategy(self, nodes=None, start=0, stop=None):
+        """
+        Strategy codes (iterations, nodes) of iterations start..stop-1.
+
+        Args:
+            nodes (optional): Node positions (index array or slice), all nodes by default.
+            start (int): First iteration.
+            stop (int, optional): End of the range, the last iteration by default.
+        """
+        return self._read("strategy", nodes, start, stop)
+
+    def payoff(self, nodes=None, start=0, stop=None):
+        """
+        Average payoffs (iterations, nodes) of iterations start..stop-1, see `strategy`.
+        """
+        return self._read("payoff", nodes, start, stop)
@@ -0,0 +1,150 @@
+"""
+Per-strategy time series of a simulation, aggregated while it runs.
+
+The per-node history (strategy_history_<n>.csv, avg_payoff_history_<n>.csv
+or a ChunkedSink) grows as nodes x iterations and has to be parsed again to
+answer questions like "cooperation rate of TitForTat players per iteration".
+StrategySeries reduces every iteration to a few numbers per strategy with
+bincounts over the agents and the moves, as `simulate(series=...)` plays it:
+
+    share             share of the agents using the strategy
+    payoff_mean       mean and variance (ddof=0) of their average payoff
+    payoff_var          per interaction, as in the average payoff CSV
+    cooperation       share of their moves that were "C"
+    mutual_defection  share of their games where both players defected
+
+and per iteration the number of links, the links broken and created by the
+rewiring, and the cooperation and mutual-defection rate of all games. An
+iteration's strategies are the ones it was played with, the payoffs the ones
+at its end. With `sink=NullSink()` the run keeps no per-node history at all:
+
+    series = StrategySeries()
+    simulate("fb_graph/matname.mtx", sink=NullSink(), series=series)
+    series.frame()            # one row per iteration and strategy
+    series.iteration_frame()  # one row per iteration
+
+Checkpoints of simulate keep the series so far, and a resumed run refills
+the series it is given from them (see `restore`).
+"""
+import numpy as np
+import pandas as pd
+
+from strategy_states import COOPERATE, DEFECT, STRATEGIES
+
+STRATEGY_COLUMNS = ["share", "payoff_mean", "payoff_var", "cooperation", "mutual_defection"]
+ITERATION_COLUMNS = ["links", "links_broken", "links_created", "cooperation", "mutual_defection"]
+
+
+def ratio(numerator, denominator):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+class StrategySeries:
+    """
+    Running aggregates of a simulation, one row of values per iteration.
+
+    Args:
+        strategy_names (list): Names of the strategy codes.
+    """
+
+    def __init__(self, strategy_names=STRATEGIES):
+        self.names = list(strategy_names)
+        self.iterations = []
+        self.per_strategy = {column: [] for column in STRATEGY_COLUMNS}
+        self.per_iteration = {column: [] for column in ITERATION_COLUMNS}
+
+    def record(self, iteration, strategy, payoff, edges, actions):
+        """
+        Add the aggregates of one iteration.
+
+        Args:
+            iteration (int): Iteration number.
+            strategy (numpy.ndarray): Strategy code of every agent during the iteration.
+            payoff (numpy.ndarray): Average payoff of every agent at its end.
+            edges (numpy.ndarray): (E, 2) links that played.
+            actions (numpy.ndarray): (E, 2) moves on those links.
+        """
+        num_strategies = len(self.names)
+        agents = np.bincount(strategy, minlength=num_strategies)
+        total = np.bincount(strategy, weights=payoff, minlength=num_strategies)
+        squares = np.bincount(strategy, weights=payoff * payoff, minlength=num_strategies)
+        mean = ratio(total, agents)
+
+        # One entry per move, grouped by the strategy of the player
+        mover = strategy[edges.ravel()]
+        cooperated = actions.ravel() == COOPERATE
+        mutual = (actions == DEFECT).all(axis=1)
+        moves = np.bincount(mover, minlength=num_strategies)
+
+        values = {
+            "share": agents / max(len(strategy), 1),
+            "payoff_mean": mean,
+            "payoff_var": np.maximum(ratio(squares, agents) - mean * mean, 0),
+            "cooperation": ratio(np.bincount(mover, weights=cooperated, minlength=num_strategies),
+                                 moves),
+            "mutual_defection": ratio(np.bincount(mover, weights=np.repeat(mutual, 2),
+                                                  minlength=num_strategies), moves),
+        }
+        for column, value in values.items():
+            self.per_strategy[column].append(value)
+        self.iterations.append(iteration)
+        self.per_iteration["links"].append(len(edges))
+        self.per_iteration["links_broken"].append(0)
+        self.per_iteration["links_created"].append(0)
+        self.per_iteration["cooperation"].append(cooperated.mean() if len(cooperated) else np.nan)
+        self.per_iteration["mutual_defection"].append(mutual.mean() if len(mutual) else np.nan)
+
+    def rewired(self, broken, created):
+        """
+        Links broken and created at the end of the last recorded iteration.
+        """
+        self.per_iteration["links_broken"][-1] = broken
+        self.per_iteration["links_created"][-1] = created
+
+    def restore(self, arrays):
+        """
+        Replace the rows with the ones of an `arrays()` result, e.g. from a checkpoint.
+        """
+        num_strategies = len(self.names)
+        if arrays["share"].shape[1:] != (num_strategies,):
+            raise ValueError(f"Saved series has {arrays['share'].shape[1:]} strategies, "
+                             f"this one has {num_strategies}.")
+        self.iterations = arrays["iteration"].tolist()
+        self.per_strategy = {column: list(arrays[column]) for column in STRATEGY_COLUMNS}
+        self.per_iteration = {column: arrays["iteration_" + column].tolist()
+                              for column in ITERATION_COLUMNS}
+
+    def arrays(self):
+        """
+        Returns:
+            dict: 'iteration' (T,), every strategy column as (T, strategies)
+            and every iteration column prefixed with "iteration_" as (T,).
+        """
+        num_strategies = len(self.names)
+        arrays = {"iteration": np.array(self.iterations, dtype=np.int64)}
+        for column, rows in self.per_strategy.items():
+            arrays[column] = np.array(rows, dtype=float).reshape(-1, num_strategies)
+        for column, values in self.per_iteration.items():
+            arrays["iteration_" + column] = np.array(values)
+        return arrays
+
+    def frame(self):
+        """
+        One row per iteration and strategy with the STRATEGY_COLUMNS.
+        """
+        arrays = self.arrays()
+        num_strategies = len(self.names)
+        return pd.DataFrame({
+            "iteration": np.repeat(arrays["iteration"], num_strategies),
+            "strategy": np.tile(self.names, len(arrays["iteration"])),
+            **{column: arrays[column].ravel() for column in STRATEGY_COLUMNS},
+        })
+
+    def iteration_frame(self):
+        """
+        One row per iteration with the ITERATION_COLUMNS.
+        """
+        arrays = self.arrays()
+        return pd.DataFrame({column: arrays["iteration_" + column] for column in ITERATION_COLUMNS},
+                            index=pd.Index(arrays["iteration"], name="iteration"))
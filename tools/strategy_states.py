@@ -0,0 +1,134 @@
+"""
+Finite-state form of the notebook strategies.
+
+None of the strategies needs the full history of a pair: TitForTat and
+Pavlovian look at the last turn, Grudger at whether the opponent ever
+defected, Appeaser at the parity of the opponent's defections and Capri at
+the last three turns. All of it fits in one small integer per directed edge,
+so memory stays the same no matter how many turns are played.
+
+State bits:
+    0-2  opponent's last 3 moves (newest is bit 0, 1 = "D")
+    3-5  own last 3 moves
+    6-7  turns played, capped at 3
+    8    opponent defected at least once
+    9    parity of the opponent's defections
+"""
+import numpy as np
+
+STRATEGIES = [
+    "TitForTat",
+    "AlwaysDefect",
+    "AlwaysCooperate",
+    "Grudger",
+    "Pavlovian",
+    "Appeaser",
+    "Capri"
+]
+(TIT_FOR_TAT, ALWAYS_DEFECT, ALWAYS_COOPERATE, GRUDGER,
+ PAVLOVIAN, APPEASER, CAPRI) = range(len(STRATEGIES))
+
+# Actions are stored as int8: 0 = "C", 1 = "D"
+COOPERATE, DEFECT = 0, 1
+ACTIONS = "CD"
+# Decide by the opponent's reputation (first turns with a new opponent)
+BY_REPUTATION = -1
+
+NUM_STATES = 1 << 10
+START_STATE = 0
+
+# (my last 3 moves, opponent's last 3 moves), oldest first, answered with "C".
+# Every other combination is answered with "D" (rule I).
+CAPRI_COOPERATE_CASES = [
+    ("CCC", "CCC"),  # Rule C: mutual cooperation
+    ("CCD", "CCC"), ("CDC", "CCD"), ("DCC", "CDC"), ("CCC", "DCC"),  # Rule A
+    ("CCD", "CDC"), ("CDC", "DCC"), ("DCC", "CCC"),  # Rule P follow-up
+    ("DDD", "DDC"), ("DDC", "DCC"), ("DDC", "DDD"),  # Rule R
+    ("DCC", "DDC"), ("DDC", "DDC"), ("DCC", "DCC"),
+]
+
+
+def moves_code(moves):
+    """
+    Encode a string of moves (oldest first) as bits, the newest move is bit 0.
+    """
+    code = 0
+    for action in moves:
+        code = (code << 1) | ACTIONS.index(action)
+    return code
+
+
+# Capri answer indexed by the low 6 bits of the state, (own << 3) | opponent
+CAPRI_TABLE = np.full(64, DEFECT, dtype=np.int8)
+for _mine, _theirs in CAPRI_COOPERATE_CASES:
+    CAPRI_TABLE[(moves_code(_mine) << 3) | moves_code(_theirs)] = COOPERATE
+
+
+def pack_state(opp_moves, own_moves, turns, opp_defected, opp_parity):
+    return (opp_moves | (own_moves << 3) | (turns << 6) |
+            (opp_defected << 8) | (opp_parity << 9))
+
+
+def unpack_state(state):
+    """
+    Split states into (opp_moves, own_moves, turns, opp_defected, opp_parity).
+    """
+    return (state & 7, (state >> 3) & 7, (state >> 6) & 3,
+            (state >> 8) & 1, (state >> 9) & 1)
+
+
+def _build_tables():
+    states = np.arange(NUM_STATES, dtype=np.int64)
+    opp_moves, own_moves, turns, opp_defected, opp_parity = unpack_state(states)
+
+    # NEXT_STATE[state, my_action, opponent_action]
+    next_state = np.empty((NUM_STATES, 2, 2), dtype=np.uint16)
+    for mine in (COOPERATE, DEFECT):
+        for theirs in (COOPERATE, DEFECT):
+            next_state[:, mine, theirs] = pack_state(
+                ((opp_moves << 1) | theirs) & 7,
+                ((own_moves << 1) | mine) & 7,
+                np.minimum(turns + 1, 3),
+                opp_defected | theirs,
+                opp_parity ^ theirs)
+
+    # ACTION_TABLE[strategy, state]
+    last_opp, last_own = opp_moves & 1, own_moves & 1
+    action_table = np.empty((len(STRATEGIES), NUM_STATES), dtype=np.int8)
+    action_table[TIT_FOR_TAT] = last_opp
+    action_table[ALWAYS_DEFECT] = DEFECT
+    action_table[ALWAYS_COOPERATE] = COOPERATE
+    action_table[GRUDGER] = opp_defected
+    # Win-Stay, Lose-Shift
+    action_table[PAVLOVIAN] = np.where(last_own == last_opp, last_own, 1 - last_own)
+    # Switch on every opponent defection
+    action_table[APPEASER] = opp_parity
+    action_table[CAPRI] = np.where(turns < 3, BY_REPUTATION, CAPRI_TABLE[states & 63])
+    # First interaction: use opponent's reputation
+    action_table[:, turns == 0] = BY_REPUTATION
+    return next_state, action_table
+
+
+NEXT_STATE, ACTION_TABLE = _build_tables()
+
+# Plain Python copies for scalar lookups, e.g. from the notebook's Agent class
+_NEXT_STATE_LISTS = NEXT_STATE.tolist()
+_STRATEGY_ACTIONS = {
+    name: [None if a == BY_REPUTATION else ACTIONS[a] for a in row]
+    for name, row in zip(STRATEGIES, ACTION_TABLE.tolist())
+}
+
+
+def next_state(state, my_action, opp_action):
+    """
+    State after one more turn, actions given as "C"/"D".
+    """
+    return _NEXT_STATE_LISTS[state][ACTIONS.index(my_action)][ACTIONS.index(opp_action)]
+
+
+def strategy_action(strategy, state):
+    """
+    Action ("C"/"D") of a strategy in a state, None when it should be decided
+    by the opponent's reputation.
+    """
+    return _STRATEGY_ACTIONS[strategy][state]
@@ -0,0 +1,223 @@
+"""
+Parameter sweeps of the vectorized simulation on a process pool.
+
+A sweep is a grid of overrides of vectorized_simulation.DEFAULT_PARAMS
+times a list of seeds. Every point runs `simulate` once and its results are
+stored in sweeps/<key>.npz, where the key is a hash of the graph file
+content, the parameters (defaults included, numbers of the type of their
+default so 10 and 10.0 are the same point), the seed, the number of
+iterations and the source of every module of this directory that sweep.py
+imports, directly or not (see code_modules). Running a sweep again, or a larger grid, only runs the points that are not
+in the cache; editing the rules changes the key of every point.
+
+The graph is loaded once in the parent process. On Linux the workers are
+forked (see parallel_tournament.pool_context), so they share its edge array
+copy-on-write instead of loading it again.
+
+    table = run_sweep("fb_graph/matname.mtx",
+                      {"link_break_scale": [5.0, 10.0, 20.0],
+                       "reputation_decay": [0.01, 0.05]},
+                      seeds=range(4), iterations=100)
+"""
+import ast
+import hashlib
+import itertools
+import json
+import numbers
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from graph_features import file_hash
+from parallel_tournament import pool_context
+from result_sink import NullSink
+from strategy_series import StrategySeries
+from strategy_states import STRATEGIES
+from vectorized_simulation import DEFAULT_PARAMS, graph_arrays, run_params, simulate
+
+SWEEP_DIR = "sweeps"
+
+# (nodes, edges) of the graph of the sweep in every worker
+worker_graph = {}
+
+
+def param_grid(grid):
+    """
+    Every combination of a {parameter: list of values} grid, as a list of dicts.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def code_modules(root=__file__):
+    """
+    Source files of `root` and of every module of its directory it imports,
+    directly or through other modules, found by reading the import statements.
+    """
+    directory = os.path.dirname(os.path.abspath(root))
+    found = set()
+    pending = [os.path.abspath(root)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                source = os.path.join(directory, name.split(".")[0] + ".py")
+                if os.path.exists(source):
+                    pending.append(source)
+    return sorted(found)
+
+
+def code_version():
+    """
+    SHA-256 of the names and source of the modules of code_modules.
+    """
+    digest = hashlib.sha256()
+    for path in code_modules():
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def point_params(params):
+    """
+    run_params of a grid point with every number of the type of its default,
+    so overrides like 10, 10.0 and numpy.float64(10) give the same run and the
+    same key. ValueError for a fraction where the default is an integer.
+    """
+    params = run_params(params)
+    for name, value in params.items():
+        kind = type(DEFAULT_PARAMS[name])
+        if kind in (int, float) and isinstance(value, numbers.Real):
+            if kind is int and value != int(value):
+                raise ValueError(f"{name} needs an integer, got {value}")
+            params[name] = kind(value)
+    return params
+
+
+def run_key(graph_hash, params, seed, iterations, code):
+    """
+    Cache key of one run, the same for overrides that give the same parameters.
+    """
+    description = json.dumps({"graph": graph_hash, "params": point_params(params),
+                              "seed": int(seed), "iterations": int(iterations), "code": code},
+                             sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()[:24]
+
+
+def init_sweep_worker(nodes, edges):
+    worker_graph["nodes"] = nodes
+    worker_graph["edges"] = edges
+
+
+def run_point(params, seed, iterations, path):
+    """
+    Run one point of a sweep and write its results to `path`.
+    """
+    series = StrategySeries()
+    population = simulate((worker_graph["nodes"], worker_graph["edges"]), iterations,
+                          seed=seed, sink=NullSink(), background_io=False, params=params,
+                          progress=False, series=series)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **series.arrays(), final_strategy=population.strategy,
+                 final_payoff=population.average_payoff(),
+                 links=np.int64(population.links.num_edges),
+                 params=np.array(json.dumps(population.params)))
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def run_sweep(graph_file, grid, seeds=(0,), iterations=100, workers=None, cache_dir=SWEEP_DIR):
+    """
+    Run every point of a parameter grid for every seed, skipping cached runs.
+
+    Args:
+        graph_file (str): Path of the .mtx file.
+        grid (dict): {parameter: list of values}, see DEFAULT_PARAMS.
+        seeds (iterable): Seeds of the replicates of every point.
+        iterations (int): Iterations of every run.
+        workers (int, optional): Number of processes, all cores by default. 1 runs in this process.
+        cache_dir (str): Directory of the cached runs.
+
+    Returns:
+        pandas.DataFrame: One row per run with its parameters, seed, cache
+        key, number of links and the final share and mean average payoff of
+        every strategy. `load_run(key)` gives the per-iteration aggregates.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    graph_hash = bytes(file_hash(graph_file)).hex()
+    code = code_version()
+    runs = []
+    for params in param_grid(grid):
+        run_params(params)  # Unknown names fail before anything runs
+        params = {name: point_params(params)[name] for name in params}
+        for seed in map(int, seeds):
+            key = run_key(graph_hash, params, seed, iterations, code)
+            runs.append((params, seed, key, os.path.join(cache_dir, key + ".npz")))
+    missing = [run for run in runs if not os.path.exists(run[3])]
+    print(f"{len(runs) - len(missing)} of {len(runs)} runs cached")
+
+    if missing:
+        nodes, edges = graph_arrays(graph_file)
+        workers = workers or os.cpu_count()
+        if workers == 1:
+            init_sweep_worker(nodes, edges)
+            for params, seed, _, path in tqdm(missing):
+                run_point(params, seed, iterations, path)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(),
+                                     initializer=init_sweep_worker,
+                                     initargs=(nodes, edges)) as pool:
+                futures = [pool.submit(run_point, params, seed, iterations, path)
+                           for params, seed, _, path in missing]
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    future.result()
+
+    rows = []
+    for params, seed, key, path in runs:
+        with np.load(path) as data:
+            strategy, payoff = data["final_strategy"], data["final_payoff"]
+            row = {**params, "seed": seed, "key": key, "links": int(data["links"])}
+        counts = np.bincount(strategy, minlength=len(STRATEGIES))
+        totals = np.bincount(strategy, weights=payoff, minlength=len(STRATEGIES))
+        for index, name in enumerate(STRATEGIES):
+            row[f"share {name}"] = counts[index] / len(strategy)
+            row[f"payoff {name}"] = totals[index] / counts[index] if counts[index] else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def load_run(key, cache_dir=SWEEP_DIR):
+    """
+    Results of a cached run.
+
+    Returns:
+        dict: The arrays of StrategySeries.arrays (per-iteration aggregates),
+        'final_strategy', 'final_payoff', 'links' and the full 'params'.
+    """
+    with np.load(os.path.join(cache_dir, key + ".npz")) as data:
+        run = {name: data[name] for name in data.files}
+    run["params"] = json.loads(str(run["params"]))
+    return run
+
+
+if __name__ == "__main__":
+    table = run_sweep("fb_graph/matname.mtx",
+                      {"link_break_scale": [5.0, 10.0, 20.0],
+                       "adaptation_warmup": [0, 10]},
+                      seeds=range(2), iterations=50)
+    print(table.round(3))
@@ -0,0 +1,208 @@
+"""
+Results of a spatial tournament kept in memory as typed columns.
+
+`axl.Tournament.play(filename=...)` writes every interaction to a CSV that
+the analysis then parses back. TournamentResults instead receives the scores
+of each shard of matches as it finishes (see parallel_tournament) and keeps:
+- one record per player and match in typed numpy columns (player index,
+  opponent index, score), the strategy names stored once as codes;
+- aggregates updated with every shard: the total score of every player and
+  the count, sum and sum of squares of the scores of every strategy against
+  every opponent strategy.
+
+The reports of analysis accept it in place of the table of load_results, and
+`save` / `load` keep a run in a small .npz file instead of a CSV:
+
+    results = TournamentResults(strategy_codes, strategies)
+    play_tournament(edges, strategy_codes, strategies, results=results)
+    players = player_table(results, "fb_graph/matname.mtx")
+    results.save("100_turns.npz")
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columns of the interactions table, as written by axl.Tournament
+RESULT_COLUMNS = {
+    "Player index": "int32",
+    "Opponent index": "int32",
+    "Player name": "category",
+    "Opponent name": "category",
+    "Score": "int64",
+}
+
+
+def score_stats(count, total, squares):
+    """
+    Mean and standard deviation (ddof=1, like pandas) from the count, sum and
+    sum of squares of the scores; NaN where there are too few scores.
+    """
+    count = np.asarray(count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        variance = (squares - total * mean) / (count - 1)
+    return {"mean": mean, "std": np.sqrt(np.maximum(variance, 0)), "count": count}
+
+
+class TournamentResults:
+    """
+    Score records of a spatial tournament, filled match by match.
+
+    Args:
+        strategy_codes (numpy.ndarray): Index into `names` for every node.
+        strategies (list): Strategy classes or their names.
+        num_edges (int): Expected number of matches, to allocate the columns once.
+    """
+
+    def __init__(self, strategy_codes, strategies, num_edges=0):
+        self.strategy_codes = np.asarray(strategy_codes, dtype=np.int16)
+        self.names = [strategy if isinstance(strategy, str) else strategy.name
+                      for strategy in strategies]
+        self.size = 0
+        self.player = np.empty(2 * num_edges, dtype=np.int32)
+        self.opponent = np.empty(2 * num_edges, dtype=np.int32)
+        self.score = np.empty(2 * num_edges, dtype=np.int64)
+
+        num_strategies = len(self.names)
+        self.node_scores = np.zeros(len(self.strategy_codes), dtype=np.int64)
+        self.node_matches = np.zeros(len(self.strategy_codes), dtype=np.int64)
+        # [player strategy, opponent strategy]
+        self.pair_count = np.zeros((num_strategies, num_strategies), dtype=np.int64)
+        self.pair_sum = np.zeros((num_strategies, num_strategies), dtype=np.int64)
+        self.pair_sum_sq = np.zeros((num_strategies, num_strategies), dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, count):
+        capacity = len(self.score)
+        if self.size + count <= capacity:
+            return
+        capacity = max(self.size + count, 2 * capacity)
+        for name in ("player", "opponent", "score"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def record(self, edges, edge_scores):
+        """
+        Add the matches of one shard: two records per match, one per player.
+
+        Args:
+            edges (numpy.ndarray): (E, 2) node indices.
+            edge_scores (numpy.ndarray): (E, 2) total scores of both players.
+        """
+        edges = np.asarray(edges).reshape(-1, 2)
+        edge_scores = np.asarray(edge_scores).reshape(-1, 2)
+        players = edges.ravel()
+        opponents = edges[:, ::-1].ravel()
+        scores = edge_scores.ravel().astype(np.int64)
+
+        self._reserve(len(players))
+        stop = self.size + len(players)
+        self.player[self.size:stop] = players
+        self.opponent[self.size:stop] = opponents
+        self.score[self.size:stop] = scores
+        self.size = stop
+
+        num_nodes = len(self.strategy_codes)
+        self.node_scores += np.bincount(players, weights=scores, minlength=num_nodes).astype(np.int64)
+        self.node_matches += np.bincount(players, minlength=num_nodes)
+        num_strategies = len(self.names)
+        pair = (self.strategy_codes[players].astype(np.int64) * num_strategies +
+                self.strategy_codes[opponents])
+        shape = (num_strategies, num_strategies)
+        size = num_strategies * num_strategies
+        self.pair_count += np.bincount(pair, minlength=size).reshape(shape)
+        # Integer sums: float weights would round the squares of long matches
+        np.add.at(self.pair_sum.reshape(-1), pair, scores)
+        np.add.at(self.pair_sum_sq.reshape(-1), pair, scores * scores)
+
+    def categorical(self, nodes):
+        return pd.Categorical.from_codes(self.strategy_codes[nodes], categories=self.names)
+
+    def frame(self):
+        """
+        The records as the table of analysis.load_results, without parsing.
+        """
+        player = self.player[:self.size]
+        opponent = self.opponent[:self.size]
+        return pd.DataFrame({
+            "Player index": player,
+            "Opponent index": opponent,
+            "Player name": self.categorical(player),
+            "Opponent name": self.categorical(opponent),
+            "Score": self.score[:self.size],
+        })
+
+    def player_scores(self):
+        """
+        Strategy and total score of every player that played, indexed by
+        "Player index" like the groupby of analysis.player_table.
+        """
+        played = np.flatnonzero(self.node_matches)
+        return pd.DataFrame({
+            "Strategy": self.categorical(played),
+            "Score": self.node_scores[played],
+        }, index=pd.Index(played, name="Player index"))
+
+    def strategy_stats(self):
+        """
+        Mean and standard deviation of the score per match of every strategy
+        against all opponents.
+
+        Returns:
+            pandas.DataFrame: Columns "mean", "std" and "count", indexed by
+            "Player name", strategies that never played are left out.
+        """
+        stats = score_stats(self.pair_count.sum(axis=1), self.pair_sum.sum(axis=1),
+                            self.pair_sum_sq.sum(axis=1))
+        played = np.flatnonzero(self.pair_count.sum(axis=1))
+        index = pd.Index(np.array(self.names)[played], name="Player name")
+        return pd.DataFrame({name: column[played] for name, column in stats.items()}, index=index)
+
+    def opponent_stats(self):
+        """
+        Mean and standard deviation of the score per match of every strategy
+        against every opponent strategy.
+
+        Returns:
+            pandas.DataFrame: Columns "mean", "std" and "count", indexed by
+            ("Player name", "Opponent name"), pairs that never met are left out.
+        """
+        stats = score_stats(self.pair_count, self.pair_sum, self.pair_sum_sq)
+        player, opponent = np.nonzero(self.pair_count)
+        names = np.array(self.names)
+        index = pd.MultiIndex.from_arrays([names[player], names[opponent]],
+                                          names=["Player name", "Opponent name"])
+        return pd.DataFrame({name: column[player, opponent] for name, column in stats.items()},
+                            index=index)
+
+    def save(self, path):
+        """
+        Write the records and aggregates to an uncompressed .npz file.
+        """
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, strategy_codes=self.strategy_codes, names=np.array(self.names),
+                     player=self.player[:self.size], opponent=self.opponent[:self.size],
+                     score=self.score[:self.size], node_scores=self.node_scores,
+                     node_matches=self.node_matches, pair_count=self.pair_count,
+                     pair_sum=self.pair_sum, pair_sum_sq=self.pair_sum_sq)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read results written by `save`.
+        """
+        with np.load(path) as data:
+            results = cls(data["strategy_codes"], data["names"].tolist())
+            results.player = data["player"]
+            results.opponent = data["opponent"]
+            results.score = data["score"]
+            results.size = len(results.score)
+            for name in ("node_scores", "node_matches", "pair_count", "pair_sum", "pair_sum_sq"):
+                setattr(results, name, data[name])
+        return results
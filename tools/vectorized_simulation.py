@@ -0,0 +1,723 @@
+"""
+Vectorized NumPy engine for the co-evolution simulation from main.ipynb.
+
+The rules are the ones of `simulate()` in the notebook (strategies, payoffs,
+reputation, strategy adoption, link breaking and preferential attachment),
+but agents are kept as strategy-code arrays, the graph as an edge-index array
+and actions as int8 vectors. Every edge of an iteration is decided and scored
+with a few array operations against a 2x2 payoff table.
+
+Differences to the notebook loop:
+- Both endpoints of an edge decide against each other (the notebook calls
+  `agent1.decide(agent2)` twice).
+- Updates are synchronous: reputations, strategies and links change once per
+  iteration from the state at its start, instead of edge by edge.
+- The memory of a pair is dropped when their link breaks, so a pair that
+  becomes friends again starts as strangers.
+
+Work is only redone where something changed. A link whose pair state maps
+to itself under mutual cooperation is "settled": it plays the same moves
+every iteration until one of its agents switches strategy, so play_iteration
+adds its payoff without deciding it. adapt_strategies keeps the best
+neighbour of every agent and looks again only at agents next to one whose
+average payoff or links changed. Without rewiring, a run whose links all
+repeat (see CycleDetector) is finished in closed form.
+
+Long runs can write checkpoints of the whole state (agents, links, pair
+memory and random generator) and resume from them with identical results.
+
+The knobs of the rules default to the constants below and can be changed per
+run with `simulate(params=...)`, see DEFAULT_PARAMS (sweep.py runs grids of
+them).
+"""
+import json
+import os
+from collections import deque
+
+import networkx as nx
+import numpy as np
+from tqdm import tqdm
+
+from background_writer import BackgroundSink
+from dynamic_graph import DynamicGraph
+from graph_loader import load_csr, num_nodes, undirected_edges
+from instrumentation import NULL_METRICS
+from result_sink import CsvSink
+from strategy_states import (ACTION_TABLE, BY_REPUTATION, COOPERATE, DEFECT,
+                             NEXT_STATE, STRATEGIES)
+
+# Payoff of the row player, PAYOFF_TABLE[my_action, opponent_action]
+PAYOFF_TABLE = np.array([[3, 0],
+                         [5, 1]], dtype=np.int64)
+
+ADAPTATION_WARMUP = 10  # No strategy adoption before this iteration
+REPUTATION_STEP = 0.1
+REPUTATION_DECAY = 0.05  # Reputation step is scaled by exp(-decay * friends)
+LINK_BREAK_SCALE = 10.0  # A link breaks with probability defections / scale
+MAX_PERIOD = 4  # Longest cycle of the pair states looked for by CycleDetector
+# Share of agents with a changed average payoff or changed links above which
+# adapt_strategies looks again at every agent instead of their neighbours
+DIRTY_SHARE = 0.05
+
+# Knobs of a run, simulate(params=...) overrides some of them
+DEFAULT_PARAMS = {
+    "reputation_decay": REPUTATION_DECAY,
+    "link_break_scale": LINK_BREAK_SCALE,
+    "adaptation_warmup": ADAPTATION_WARMUP,
+    "attachment_scale": 1.0,  # A node creates a link with probability scale * degree / N
+    "strategy_mix": None,  # Initial share of every strategy, uniform by default
+}
+
+
+def run_params(params=None):
+    """
+    DEFAULT_PARAMS with the given overrides, ValueError for unknown names.
+    """
+    params = dict(params or {})
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    if params.get("strategy_mix") is not None:
+        mix = np.asarray(params["strategy_mix"], dtype=float)
+        if len(mix) != len(STRATEGIES) or (mix < 0).any() or mix.sum() <= 0:
+            raise ValueError(f"strategy_mix needs {len(STRATEGIES)} non-negative weights.")
+        params["strategy_mix"] = (mix / mix.sum()).tolist()
+    return {**DEFAULT_PARAMS, **params}
+
+
+def edge_field(name):
+    """
+    Attribute for a per-edge array kept in the population's DynamicGraph.
+    """
+    def get(self):
+        return self.links.edge_data[name][:self.links.num_edges]
+
+    def set(self, value):
+        self.links.edge_data[name][:self.links.num_edges] = value
+
+    return property(get, set)
+
+
+class Population:
+    """
+    Array-backed state of all agents and of the links between them.
+
+    Per-edge arrays have shape (E, 2): column 0 is the view of the node in
+    `edges[:, 0]` and column 1 the view of the node in `edges[:, 1]`.
+
+    Args:
+        nodes (list): Node labels, position in the list is the node index.
+        edges (numpy.ndarray): Undirected edges as an (E, 2) array of node indices.
+        rng (numpy.random.Generator): Random generator used for every draw.
+        params (dict, optional): Overrides of DEFAULT_PARAMS.
+    """
+
+    state = edge_field("state")  # History of the pair, see strategy_states
+    defection_count = edge_field("defection_count")
+    settled = edge_field("settled")  # Mutual cooperation that repeats, see play_iteration
+
+    def __init__(self, nodes, edges, rng, params=None):
+        self.nodes = list(nodes)
+        self.num_nodes = len(self.nodes)
+        self.rng = rng
+        self.params = run_params(params)
+
+        if self.params["strategy_mix"] is None:
+            self.strategy = rng.integers(
+                len(STRATEGIES), size=self.num_nodes).astype(np.int8)
+        else:
+            self.strategy = rng.choice(len(STRATEGIES), size=self.num_nodes,
+                                       p=self.params["strategy_mix"]).astype(np.int8)
+        self.score = np.zeros(self.num_nodes, dtype=np.int64)
+        self.interaction_count = np.zeros(self.num_nodes, dtype=np.int64)
+        self.reputation = np.ones(self.num_nodes)
+
+        # Links with the memory of both endpoints, new links start as strangers
+        self.links = DynamicGraph(self.num_nodes, edges)
+        self.links.add_edge_array("state", np.uint16, (2,))
+        self.links.add_edge_array("defection_count", np.int32, (2,))
+        self.links.add_edge_array("settled", bool)
+
+        # Average payoffs, best neighbour averages and best neighbours of the
+        # last adaptation, and the agents whose links changed since then
+        self.best = None
+        self.relinked = np.zeros(self.num_nodes, dtype=bool)
+
+    @property
+    def edges(self):
+        return self.links.edges
+
+    def average_payoff(self):
+        """
+        Average payoff per interaction, 0.0 for agents that never played.
+        """
+        average = np.zeros(self.num_nodes)
+        np.divide(self.score, self.interaction_count,
+                  out=average, where=self.interaction_count > 0)
+        return average
+
+    def to_networkx(self):
+        """
+        Build a networkx graph with the node labels and the current links.
+        """
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes)
+        labels = np.asarray(self.nodes, dtype=object)
+        graph.add_edges_from(zip(labels[self.edges[:, 0]], labels[self.edges[:, 1]]))
+        return graph
+
+
+def graph_arrays(graph):
+    """
+    Node labels and (E, 2) edge index array of a graph.
+
+    Args:
+        graph (networkx.Graph, str or tuple): Graph, path of a .mtx file
+            (nodes are then its 0-based indices) or (nodes, edges) arrays.
+    """
+    if isinstance(graph, tuple):
+        return graph
+    if isinstance(graph, str):
+        csr = load_csr(graph)
+        return range(num_nodes(csr)), undirected_edges(csr)
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()],
+                     dtype=np.int64).reshape(-1, 2)
+    return nodes, edges
+
+
+def decide(population, edges=None, state=None):
+    """
+    Decide the actions of both endpoints of every edge.
+
+    Args:
+        population (Population): Current state.
+        edges (numpy.ndarray, optional): (E, 2) links to decide, all by default.
+        state (numpy.ndarray, optional): Their pair states.
+
+    Returns:
+        numpy.ndarray: int8 actions of shape (E, 2).
+    """
+    p = population
+    if edges is None:
+        edges, state = p.edges, p.state
+    actions = ACTION_TABLE[p.strategy[edges], state]
+
+    # First interactions: cooperate with the probability of opponent's reputation
+    fresh = actions == BY_REPUTATION
+    opponent = edges[:, ::-1][fresh]
+    actions[fresh] = p.rng.random(len(opponent)) >= p.reputation[opponent]
+    return actions
+
+
+def turn_totals(population, actions, edges=None):
+    """
+    Payoff and cooperations minus defections of every agent in one turn.
+
+    Args:
+        population (Population): Current state.
+        actions (numpy.ndarray): (E, 2) moves.
+        edges (numpy.ndarray, optional): Links of the moves, all by default.
+
+    Returns:
+        tuple: int64 payoffs and float net cooperations, one per agent.
+    """
+    p = population
+    owner = (p.edges if edges is None else edges).ravel()
+    payoff = PAYOFF_TABLE[actions, actions[:, ::-1]]
+    return (np.bincount(owner, weights=payoff.ravel(),
+                        minlength=p.num_nodes).astype(np.int64),
+            np.bincount(owner, weights=1 - 2 * actions.ravel(),
+                        minlength=p.num_nodes))
+
+
+def update_reputation(population, net):
+    """
+    Cooperation raises the reputation, defection lowers it, more so for
+    agents with less friends.
+    """
+    p = population
+    scale = np.exp(-p.params["reputation_decay"] * p.links.degree)
+    np.clip(p.reputation + REPUTATION_STEP * scale * net, 0.0, 1.0,
+            out=p.reputation)
+
+
+def play_iteration(population):
+    """
+    Play one turn on every edge, then update scores, memory and reputations.
+
+    Only the links that are not settled are decided. A settled link has both
+    agents cooperating from a pair state that mutual cooperation maps to
+    itself, so it repeats until one of them switches strategy; it adds
+    payoff 3 and one net cooperation to both ends and never draws a random
+    number, which keeps the results those of deciding every link.
+
+    Returns:
+        numpy.ndarray: int8 actions of shape (E, 2).
+    """
+    p = population
+    active = np.flatnonzero(~p.settled)
+    edges = p.edges[active]
+    state = p.state[active]
+    actions = decide(p, edges, state)
+    payoff, net = turn_totals(p, actions, edges)
+    settled_degree = p.links.degree - np.bincount(edges.ravel(), minlength=p.num_nodes)
+    p.score += payoff + PAYOFF_TABLE[COOPERATE, COOPERATE] * settled_degree
+    p.interaction_count += p.links.degree
+
+    next_state = NEXT_STATE[state, actions, actions[:, ::-1]]
+    p.state[active] = next_state
+    p.defection_count[active] += actions == DEFECT
+    p.settled[active] = ((actions[:, 0] == COOPERATE) & (actions[:, 1] == COOPERATE) &
+                         (next_state[:, 0] == state[:, 0]) & (next_state[:, 1] == state[:, 1]))
+    update_reputation(p, net + settled_degree)
+
+    all_actions = np.zeros(p.edges.shape, dtype=np.int8)  # Settled links cooperate
+    all_actions[active] = actions
+    return all_actions
+
+
+def adapt_strategies(population, current_iteration):
+    """
+    - We don't do strategy adoptions in the first adaptation_warmup rounds (10).
+    - After that, we adopt the strategy of neighbour with highest average payoff
+    with probability increasing with difference in our average payoffs.
+
+    Returns:
+        int: Number of agents that switched to another strategy.
+    """
+    if current_iteration < population.params["adaptation_warmup"]:
+        return 0
+
+    p = population
+    played = p.interaction_count > 0
+    neighbor_avg = np.full(p.num_nodes, -np.inf)
+    np.divide(p.score, p.interaction_count, out=neighbor_avg, where=played)
+    my_avg = p.score / (p.interaction_count + 1e-6)
+
+    # Best neighbour average with a segmented max over both directions of
+    # every edge, the segment is the owner. Rebuilding a CSR after every
+    # rewiring would cost more than the reduction itself.
+    first, second = p.edges[:, 0], p.edges[:, 1]
+    if p.best is None:
+        changed = np.ones(p.num_nodes, dtype=bool)
+    else:
+        last_avg, best_avg, best_neighbor = p.best
+        changed = neighbor_avg != last_avg
+    if np.count_nonzero(changed | p.relinked) > DIRTY_SHARE * p.num_nodes:
+        owner = np.concatenate([first, second])
+        neighbors = np.concatenate([second, first])
+        best_avg = np.full(p.num_nodes, -np.inf)
+        best_neighbor = np.full(p.num_nodes, p.num_nodes)
+    else:
+        # Only agents with changed links or next to a changed average can
+        # have another best neighbour than in the last adaptation
+        dirty = p.relinked.copy()
+        dirty[first[changed[second]]] = True
+        dirty[second[changed[first]]] = True
+        forward, backward = dirty[first], dirty[second]
+        owner = np.concatenate([first[forward], second[backward]])
+        neighbors = np.concatenate([second[forward], first[backward]])
+        best_avg[dirty] = -np.inf
+        best_neighbor[dirty] = p.num_nodes
+    friend_avg = neighbor_avg[neighbors]
+    np.maximum.at(best_avg, owner, friend_avg)
+    # Lowest-index neighbour reaching the best average, agents without
+    # friends point to themselves
+    hits = friend_avg == best_avg[owner]
+    np.minimum.at(best_neighbor, owner[hits], neighbors[hits])
+    lonely = best_neighbor == p.num_nodes
+    best_neighbor[lonely] = np.flatnonzero(lonely)
+    p.best = (neighbor_avg, best_avg, best_neighbor)
+    p.relinked[:] = False
+
+    # Probability proportional to payoff difference
+    payoff_diff = best_avg - my_avg
+    prob = np.minimum(1.0, payoff_diff / (my_avg + 1e-6))
+    adopt = (payoff_diff > 0) & (p.rng.random(p.num_nodes) < prob)
+    new_strategy = np.where(adopt, p.strategy[best_neighbor], p.strategy)
+    switched = new_strategy != p.strategy
+    switches = int(np.count_nonzero(switched))
+    if switches:
+        # Their links are decided again in the next play
+        p.settled[switched[p.edges[:, 0]] | switched[p.edges[:, 1]]] = False
+    p.strategy = new_strategy
+    return switches
+
+
+def rewire(population):
+    """
+    Break links based on defections and create new ones by preferential attachment.
+
+    Returns:
+        tuple: Number of links broken and created.
+    """
+    p = population
+    # Each endpoint breaks the link with probability own defections / link_break_scale
+    defected = p.defection_count > 0
+    breaks = np.zeros(p.edges.shape, dtype=bool)
+    breaks[defected] = p.rng.random(np.count_nonzero(defected)) < \
+        p.defection_count[defected] / p.params["link_break_scale"]
+    broken = breaks[:, 0] | breaks[:, 1]
+
+    # Friends are picked from the links at the start of the rewiring phase
+    prob_create = p.params["attachment_scale"] * p.links.degree / (p.num_nodes + 1e-6)
+    creators = np.flatnonzero(p.rng.random(p.num_nodes) < prob_create)
+    new_links = []
+    for node in creators:
+        new_friend = p.links.random_non_neighbor(node, p.rng)
+        if new_friend is not None:
+            new_links.append((node, new_friend))
+
+    p.relinked[p.edges[broken].ravel()] = True
+    p.links.remove_slots(np.flatnonzero(broken))
+    # Two agents may have picked each other, add_edges skips the duplicate
+    added = p.links.add_edges(new_links)
+    p.relinked[added.ravel()] = True
+    return int(broken.sum()), len(added)
+
+
+class CycleDetector:
+    """
+    Notice when a run without rewiring has reached a periodic steady state.
+
+    The run is periodic from iteration t on when, over the last L <= MAX_PERIOD
+    iterations:
+    - no agent switched strategy and every link joins two agents with the
+      same strategy, so adopting the best neighbour changes nothing;
+    - every move followed from the pair's state (no reputation draws);
+    - the pair states before iteration t equal the ones L iterations earlier.
+    The moves of those L iterations then repeat forever.
+    """
+
+    def __init__(self, max_period=MAX_PERIOD):
+        self.states = deque(maxlen=max_period + 1)
+        self.actions = deque(maxlen=max_period + 1)
+
+    def update(self, population, state_before, actions, switches):
+        """
+        Record an iteration and look for a cycle.
+
+        Args:
+            population (Population): State after the iteration.
+            state_before (numpy.ndarray): Pair states before the iteration.
+            actions (numpy.ndarray): Moves of the iteration.
+            switches (int): Strategy switches of the iteration.
+
+        Returns:
+            tuple or None: (pair states, moves) of the L iterations of the
+            cycle, in the order they repeat, None if the run is not periodic.
+        """
+        if switches:
+            self.states.clear()
+            self.actions.clear()
+            return None
+        self.states.append(state_before)
+        self.actions.append(actions)
+        if len(self.states) < 2:
+            return None
+
+        p = population
+        strategies = p.strategy[p.edges]
+        if not np.array_equal(strategies[:, 0], strategies[:, 1]):
+            return None
+        for period in range(1, len(self.states)):
+            if np.array_equal(self.states[-1], self.states[-1 - period]):
+                states = list(self.states)[-period:]
+                if all((ACTION_TABLE[strategies, state] != BY_REPUTATION).all()
+                       for state in states):
+                    return states, list(self.actions)[-period:]
+                return None
+        return None
+
+
+def fast_forward(population, cycle, start, stop):
+    """
+    Advance a periodic run over iterations start..stop-1 without playing.
+
+    The per-edge memory and the random generator are set to their state at
+    `stop` right away, then the generator yields once per iteration after
+    updating scores, interaction counts and reputations exactly as
+    play_iteration would.
+
+    Args:
+        population (Population): State after iteration start-1.
+        cycle (tuple): (pair states, moves) returned by CycleDetector.update.
+        start (int): First iteration to skip.
+        stop (int): End of the run.
+
+    Yields:
+        tuple: (iteration, moves of the iteration).
+    """
+    p = population
+    states, actions = cycle
+    period = len(actions)
+    steps = stop - start
+
+    defections = [moves == DEFECT for moves in actions]
+    p.defection_count += ((steps // period) * sum(defections) +
+                          sum(defections[:steps % period]))
+    p.state = states[steps % period]
+    # A stepwise run draws one number per agent in every adaptation
+    draws = max(0, stop - max(start, p.params["adaptation_warmup"])) * p.num_nodes
+    if hasattr(p.rng.bit_generator, "advance"):
+        p.rng.bit_generator.advance(draws)
+    else:
+        for _ in range(draws // max(p.num_nodes, 1)):
+            p.rng.random(p.num_nodes)
+
+    totals = [turn_totals(p, moves) for moves in actions]
+    for step, iteration in enumerate(range(start, stop)):
+        payoff, net = totals[step % period]
+        p.score += payoff
+        p.interaction_count += p.links.degree
+        update_reputation(p, net)
+        yield iteration, actions[step % period]
+
+
+def save_checkpoint(population, iteration, path, series=None):
+    """
+    Write the full simulation state to an uncompressed .npz file.
+
+    The file is replaced atomically, so a crash while writing keeps the
+    previous checkpoint.
+
+    Args:
+        population (Population): State to save.
+        iteration (int): Number of iterations done so far.
+        path (str): Checkpoint file.
+        series (strategy_series.StrategySeries, optional): Aggregates of the
+            iterations done, saved with the state.
+    """
+    p = population
+    nodes = np.asarray(p.nodes)
+    if nodes.dtype == object:
+        nodes = nodes.astype(str)
+    arrays = {
+        "iteration": np.int64(iteration),
+        "nodes": nodes,
+        "strategy": p.strategy,
+        "score": p.score,
+        "interaction_count": p.interaction_count,
+        "reputation": p.reputation,
+        "edges": p.edges.astype(np.int32),  # In slot order
+        "rng_state": np.array(json.dumps(p.rng.bit_generator.state)),
+        "params": np.array(json.dumps(p.params)),
+    }
+    for name in p.links.edge_data:
+        arrays["edge_" + name] = p.links.edge_data[name][:p.links.num_edges]
+    if series is not None:
+        for name, array in series.arrays().items():
+            arrays["series_" + name] = array
+
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path, series=None):
+    """
+    Read a checkpoint written by save_checkpoint.
+
+    Args:
+        path (str): Checkpoint file.
+        series (strategy_series.StrategySeries, optional): Refilled with the
+            aggregates saved in the checkpoint, ValueError if it has none.
+
+    Returns:
+        tuple: (Population, number of iterations done).
+    """
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    if series is not None:
+        saved = {name[len("series_"):]: array for name, array in arrays.items()
+                 if name.startswith("series_")}
+        if not saved:
+            raise ValueError(f"{path} was written by a run without a series, "
+                             "the aggregates of its first iterations are lost.")
+        series.restore(saved)
+
+    rng_state = json.loads(str(arrays["rng_state"]))
+    rng = getattr(np.random, rng_state["bit_generator"])()
+    # Checkpoints from before the parameters were saved used the defaults
+    params = json.loads(str(arrays["params"])) if "params" in arrays else None
+    population = Population(arrays["nodes"].tolist(), np.empty((0, 2)),
+                            np.random.Generator(rng), params)
+    population.strategy = arrays["strategy"]
+    population.score = arrays["score"]
+    population.interaction_count = arrays["interaction_count"]
+    population.reputation = arrays["reputation"]
+    population.links = DynamicGraph.from_arrays(
+        population.num_nodes, arrays["edges"],
+        {name[len("edge_"):]: array for name, array in arrays.items()
+         if name.startswith("edge_")})
+    if "settled" not in population.links.edge_data:
+        # Older checkpoints: every link is decided again once
+        population.links.add_edge_array("settled", bool)
+    rng.state = rng_state
+    return population, int(arrays["iteration"])
+
+
+def simulate(
+    graph,
+    iterations=100,
+    strategy_csv="strategy_history.csv",
+    payoff_csv="average_payoff.csv",
+    seed=None,
+    sink=None,
+    checkpoint=None,
+    checkpoint_every=50,
+    metrics=None,
+    interaction_log=None,
+    background_io=True,
+    rewiring=True,
+    steady_state=True,
+    params=None,
+    progress=True,
+    series=None
+):
+    """
+    At each iteration, each agent plays one turn with each of its neighbours.
+
+    Args:
+        graph (networkx.Graph, str or tuple): Initial friendship graph, it is
+            not modified, the path of a .mtx file (nodes are its 0-based
+            indices) or the (nodes, edges) arrays of graph_arrays.
+        iterations (int): Number of iterations.
+        strategy_csv (str): Output file for the strategy at the start of each iteration.
+        payoff_csv (str): Output file for the average payoff at the end of each iteration.
+        seed (int, optional): Seed of the random generator.
+        sink (optional): Where the per-iteration strategies and payoffs go
+            (see result_sink), CSV files by default.
+        checkpoint (str, optional): Checkpoint file. If it exists, the run
+            continues from it (`graph` and `seed` are then ignored),
+            otherwise it is written every `checkpoint_every` iterations.
+            It is removed once the run has finished and its outputs are
+            closed, so running the same call again starts a new run.
+        checkpoint_every (int): Iterations between checkpoints.
+        metrics (instrumentation.Metrics, optional): Receives the time of every
+            phase and the counters of every iteration, off by default.
+        interaction_log (interaction_log.InteractionLog, optional): Receives
+            the moves of every edge in every iteration, off by default.
+        background_io (bool): Write the sink and the interaction log on a
+            background thread (see background_writer), so the loop only
+            waits for them at checkpoints and at the end.
+        rewiring (bool): Break and create links, as in the notebook.
+        steady_state (bool): Without rewiring, detect when the run has become
+            periodic (see CycleDetector) and compute the remaining iterations
+            in closed form. The results, random generator included, are the
+            ones of playing them.
+        params (dict, optional): Overrides of DEFAULT_PARAMS, e.g.
+            {"link_break_scale": 20.0}. A resumed run keeps the ones of its
+            checkpoint.
+        progress (bool): Show a progress bar.
+        series (strategy_series.StrategySeries, optional): Receives the
+            per-strategy aggregates of every iteration, off by default. With
+            a result_sink.NullSink as `sink` no per-node history is kept.
+            Checkpoints keep it, a resumed run refills it with the
+            iterations done before.
+
+    Returns:
+        Population: Final state of the agents and links.
+    """
+    start = 0
+    if checkpoint is not None and os.path.exists(checkpoint):
+        population, start = load_checkpoint(checkpoint, series)
+        print(f"Resuming from iteration {start}")
+    else:
+        population = Population(*graph_arrays(graph), np.random.default_rng(seed), params)
+
+    if sink is None:
+        sink = CsvSink(strategy_csv, payoff_csv)
+    if metrics is None:
+        metrics = NULL_METRICS
+    if background_io:
+        sink = BackgroundSink(sink)
+        if interaction_log is not None:
+            interaction_log = BackgroundSink(interaction_log)
+    sink.open(population.nodes, STRATEGIES, start)
+    outputs = [sink]
+    if interaction_log is not None:
+        interaction_log.open(population.num_nodes, start)
+        outputs.append(interaction_log)
+    bytes_written = 0
+
+    detector = CycleDetector() if steady_state and not rewiring else None
+    skipped = None  # Iterations computed by fast_forward once the run is periodic
+    for iteration in tqdm(range(start, iterations), initial=start, total=iterations,
+                          disable=not progress):
+        # Record strategy at the **start** of the iteration
+        strategy = population.strategy.copy()
+        if metrics.enabled:
+            # Settled links are skipped by play_iteration, only count them with metrics on
+            settled = np.count_nonzero(population.settled)
+            metrics.count("edges_played", population.links.num_edges - settled)
+            metrics.count("edges_settled", settled)
+        if skipped is None:
+            state_before = population.state.copy() if detector is not None else None
+            with metrics.phase("play"):
+                actions = play_iteration(population)
+        else:
+            with metrics.phase("fast_forward"):
+                _, actions = next(skipped)
+        with metrics.phase("record"):
+            payoff = population.average_payoff()
+            sink.append(strategy, payoff)
+            if interaction_log is not None:
+                interaction_log.append(population.edges, actions)
+            if series is not None:
+                series.record(iteration, strategy, payoff, population.edges, actions)
+
+        if skipped is None:
+            with metrics.phase("adapt"):
+                switches = adapt_strategies(population, iteration)
+            metrics.count("strategy_switches", switches)
+            if rewiring:
+                with metrics.phase("rewire"):
+                    broken, created = rewire(population)
+                metrics.count("links_broken", broken)
+                metrics.count("links_created", created)
+                if series is not None:
+                    series.rewired(broken, created)
+            if detector is not None and iteration + 1 < iterations:
+                cycle = detector.update(population, state_before, actions, switches)
+                if cycle is not None:
+                    if progress:
+                        tqdm.write(f"Periodic with period {len(cycle[1])} after iteration "
+                                   f"{iteration}, fast-forwarding the rest")
+                    skipped = fast_forward(population, cycle, iteration + 1, iterations)
+
+            if checkpoint is not None and (iteration + 1) % checkpoint_every == 0:
+                with metrics.phase("checkpoint"):
+                    for output in outputs:
+                        output.flush()
+                    save_checkpoint(population, iteration + 1, checkpoint, series)
+        written = sum(output.bytes_written for output in outputs)
+        metrics.count("bytes_written", written - bytes_written)
+        bytes_written = written
+        metrics.end_iteration(iteration)
+
+    with metrics.phase("output"):
+        for output in outputs:
+            output.close()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        # The run is complete, resuming from here would append nothing
+        os.remove(checkpoint)
+    written = sum(output.bytes_written for output in outputs)
+    metrics.count("bytes_written", written - bytes_written)
+    metrics.end_iteration(None)
+    metrics.close()
+    return population
+
+
+if __name__ == "__main__":
+    mtx_file = "fb_graph/matname.mtx"
+
+    n_iter = 100
+    population = simulate(
+        mtx_file,
+        iterations=n_iter,
+        strategy_csv=f"strategy_history_{n_iter}.csv",
+        payoff_csv=f"avg_payoff_history_{n_iter}.csv"
+    )